@@ -0,0 +1,170 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+
+def is_numeric_column(series):
+    """Same columns as select_dtypes(include=['number']): numeric, but not boolean."""
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _is_missing(value):
+    return value is None or (np.ndim(value) == 0 and bool(pd.isna(value)))
+
+
+def _numeric_values(series):
+    values = series.to_numpy(dtype='float64', na_value=np.nan)
+    return values[~np.isnan(values)]
+
+
+class ColumnSummary:
+    """
+    Description statistics of one column.
+    Numeric columns keep their count and sums shifted by the initial mean, which single values
+    can be added to or removed from exactly, so mean and standard deviation never need a rescan.
+    Median, mode, min, max and the unique count come from one temporary sorted copy of the column;
+    they are cached, and recomputed from the column only when an edit has made them stale.
+    No copy of the column is kept.
+    """
+
+    def __init__(self, series):
+        self.dtype = series.dtype
+        self.missing = int(series.isna().sum())
+        self.numeric = is_numeric_column(series)
+        self.unique = None
+        self.order_stale = False
+        if self.numeric:
+            values = _numeric_values(series)
+            self.count = len(values)
+            self.shift = float(values.mean()) if len(values) else 0.0
+            deviations = values - self.shift
+            self.sum = float(deviations.sum())
+            self.sum_squares = float(np.dot(deviations, deviations))
+            del deviations
+            self._order_statistics(values)
+        else:
+            self.unique = int(series.nunique())
+
+    def _order_statistics(self, values):
+        """Median, mode (smallest of the most frequent values, like DataFrame.mode().iloc[0]), min, max, unique count."""
+        values = np.sort(values)
+        n = len(values)
+        self.order_stale = False
+        if not n:
+            self.median = self.mode_value = self.min = self.max = np.nan
+            self.unique = 0
+            return
+        self.median = values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2
+        self.min, self.max = values[0], values[-1]
+        starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+        lengths = np.diff(np.append(starts, n))
+        self.unique = len(starts)
+        self.mode_value = values[starts[int(np.argmax(lengths))]]
+
+    def refresh(self, series):
+        """Recompute the order statistics from the current column if an edit made them stale."""
+        if self.numeric and self.order_stale:
+            self._order_statistics(_numeric_values(series))
+
+    def add(self, value):
+        if _is_missing(value):
+            self.missing += 1
+            return
+        value = float(value)
+        self.count += 1
+        self.sum += value - self.shift
+        self.sum_squares += (value - self.shift) ** 2
+        self.order_stale = True
+
+    def remove(self, value):
+        if _is_missing(value):
+            self.missing -= 1
+            return
+        value = float(value)
+        self.count -= 1
+        self.sum -= value - self.shift
+        self.sum_squares -= (value - self.shift) ** 2
+        self.order_stale = True
+
+    def statistics(self):
+        """Mean, Median, Mode, Std Dev, Min and Max of a numeric column (call refresh() first after edits)."""
+        n = self.count
+        if n == 0:
+            return [np.nan] * 6
+        mean = self.shift + self.sum / n
+        std = np.sqrt(max(self.sum_squares - self.sum ** 2 / n, 0.0) / (n - 1)) if n > 1 else np.nan
+        return [mean, self.median, self.mode_value, std, self.min, self.max]
+
+
+class ColumnStatistics:
+    """
+    Per-column description statistics of the viewer's dataset, tied to a dataset version.
+    Columns are summarised in parallel the first time; single-cell updates and row deletions are
+    then applied to the cached summaries instead of rescanning the dataset.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.version = None
+        self.summaries = {}
+
+    def invalidate(self):
+        self.version = None
+        self.summaries = {}
+
+    def get(self, data, version):
+        """Summaries of every column of data, computing only the ones that are missing or stale."""
+        if version != self.version:
+            self.summaries = {}
+            self.version = version
+        missing = [column for column in data.columns if column not in self.summaries]
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for column, summary in zip(missing, executor.map(lambda c: ColumnSummary(data[c]), missing)):
+                    self.summaries[column] = summary
+        for column in data.columns:
+            self.summaries[column].refresh(data[column])
+        return [self.summaries[column] for column in data.columns]
+
+    def cell_updated(self, previous_version, version, column, old_value, new_series, row):
+        """Apply a single-cell edit made between two versions to the cached summaries."""
+        if self.version != previous_version:
+            return
+        self.version = version
+        summary = self.summaries.get(column)
+        if summary is None:
+            return
+        if summary.numeric and new_series.dtype == summary.dtype:
+            summary.remove(old_value)
+            summary.add(new_series.at[row])
+        else:
+            # Dtype changed or non-numeric column: summarise this column again on next use
+            del self.summaries[column]
+
+    def row_deleted(self, previous_version, version, previous_data, row):
+        """Apply the deletion of one row of previous_data to the cached summaries."""
+        if self.version != previous_version:
+            return
+        self.version = version
+        for column in list(self.summaries):
+            summary = self.summaries[column]
+            if summary.numeric:
+                summary.remove(previous_data[column].at[row])
+            else:
+                del self.summaries[column]
+
+    def describe(self, data, version):
+        """(overview, stats) tables shown by the dataset description."""
+        summaries = self.get(data, version)
+        overview = pd.DataFrame({
+            "Column Name": [str(column) for column in data.columns],
+            "Data Type": [str(summary.dtype) for summary in summaries],
+            "Missing Values": [summary.missing for summary in summaries],
+            "Unique Values": [summary.unique for summary in summaries],
+        }, index=data.columns)
+        numeric = [(column, summary) for column, summary in zip(data.columns, summaries) if summary.numeric]
+        stats = pd.DataFrame([summary.statistics() for _, summary in numeric],
+                             index=[column for column, _ in numeric],
+                             columns=["Mean", "Median", "Mode", "Std Dev", "Min", "Max"])
+        return overview, stats
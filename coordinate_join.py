@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+# Quantized latitudes are packed into the upper 31 bits of a key (so keys stay non-negative) and
+# longitudes into the lower 32, both shifted by these offsets to be non-negative
+LATITUDE_OFFSET = 2 ** 30
+LONGITUDE_OFFSET = 2 ** 31
+# Highest precision accepted; at 7 decimals keys hold latitudes within ±107 and longitudes
+# within ±214 degrees, at 5 decimals any coordinate up to ±10000 degrees
+MAX_PRECISION = 7
+
+
+def _quantized(latitude, longitude, precision):
+    """(latitude, longitude, valid): coordinates rounded to `precision` decimals and scaled to whole numbers."""
+    if not 0 <= precision <= MAX_PRECISION:
+        raise ValueError(f"Coordinate precision must be between 0 and {MAX_PRECISION} decimals.")
+    scale = 10.0 ** precision
+    latitude = np.asarray(latitude, dtype='float64')
+    longitude = np.asarray(longitude, dtype='float64')
+    valid = np.isfinite(latitude) & np.isfinite(longitude)
+    return (np.rint(np.where(valid, latitude, 0.0) * scale), np.rint(np.where(valid, longitude, 0.0) * scale),
+            valid)
+
+
+def _fits_keys(lat, lon):
+    return bool(np.all(np.abs(lat) < LATITUDE_OFFSET) and np.all(np.abs(lon) < LONGITUDE_OFFSET))
+
+
+def _pack(lat, lon, valid):
+    keys = ((lat.astype(np.int64) + LATITUDE_OFFSET) << 32) | (lon.astype(np.int64) + LONGITUDE_OFFSET)
+    return np.where(valid, keys, -1)
+
+
+def coordinate_keys(latitude, longitude, precision=5):
+    """
+    int64 join key per point: latitude and longitude rounded to `precision` decimals, shifted to
+    be non-negative and packed as (lat << 32) | lon, so keys sort by latitude, then longitude.
+    Points with a missing coordinate get -1. Raises ValueError for coordinates too large to be
+    packed at this precision, rather than leaving them unmatched.
+    """
+    lat, lon, valid = _quantized(latitude, longitude, precision)
+    if not _fits_keys(lat, lon):
+        raise ValueError(f"Some coordinates are too large to be matched at {precision} decimals; "
+                         f"use a lower coordinate precision.")
+    return _pack(lat, lon, valid)
+
+
+def sorted_codes(values, missing):
+    """
+    Dense integer code per value, numbered in sorted value order, through a hash factorization
+    (only the distinct values are sorted). Positions where `missing` is True get -1.
+    Returns (codes, sorted distinct values).
+    """
+    codes, uniques = pd.factorize(values[~missing])
+    order = np.argsort(uniques, kind='stable')
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    all_codes = np.full(len(values), -1, dtype=np.int64)
+    all_codes[~missing] = rank[codes]
+    return all_codes, np.asarray(uniques)[order]
+
+
+def coordinate_codes(latitude, longitude, precision=MAX_PRECISION):
+    """
+    Dense integer id per distinct point at `precision` decimals, numbered in (latitude, longitude)
+    order; -1 for a missing coordinate. Unlike coordinate_keys this accepts any finite coordinate.
+    """
+    lat, lon, valid = _quantized(latitude, longitude, precision)
+    if _fits_keys(lat, lon):
+        keys = _pack(lat, lon, valid)
+        return sorted_codes(keys, keys < 0)[0]
+    # Too large to pack into one key: rank latitudes and longitudes separately, then the pairs
+    lat_codes, _ = sorted_codes(lat, ~valid)
+    lon_codes, lon_values = sorted_codes(lon, ~valid)
+    return sorted_codes(lat_codes * len(lon_values) + lon_codes, ~valid)[0]
+
+
+class KeyIndex:
+    """
+    Join keys of one side of the join, for vectorised lookups of many keys at once.
+    Unique keys (one row per grid point) are looked up through a hash index; duplicated keys
+    through binary search of the sorted keys.
+    """
+
+    def __init__(self, keys):
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+        # Rows without a valid key sort first and are never matched
+        self.first_valid = int(np.searchsorted(self.sorted_keys, 0))
+        valid_keys = self.sorted_keys[self.first_valid:]
+        self.unique = bool(np.all(valid_keys[1:] != valid_keys[:-1]))
+        # Only valid keys are indexed: the -1 of every row without coordinates would make the index non-unique
+        self.lookup = pd.Index(valid_keys) if self.unique else None
+
+    def match(self, keys):
+        """
+        (indexed positions, looked-up positions) of every pair of rows with equal keys, ordered
+        by looked-up position and then by indexed position.
+        """
+        if self.unique:
+            positions = self.lookup.get_indexer(keys)
+            found = np.flatnonzero((positions >= 0) & (keys >= 0))
+            return self.order[self.first_valid:][positions[found]], found
+        # Binary search is much faster for sorted queries; results are put back in query order
+        query_order = np.argsort(keys, kind='stable')
+        sorted_queries = keys[query_order]
+        left = np.empty(len(keys), dtype=np.int64)
+        right = np.empty(len(keys), dtype=np.int64)
+        left[query_order] = np.searchsorted(self.sorted_keys, sorted_queries, side='left')
+        right[query_order] = np.searchsorted(self.sorted_keys, sorted_queries, side='right')
+        left = np.maximum(left, self.first_valid)
+        counts = np.maximum(right - left, 0)
+        total = int(counts.sum())
+        looked_up = np.repeat(np.arange(len(keys)), counts)
+        # Positions left[i], left[i] + 1, ..., right[i] - 1 for every looked-up row, flattened
+        starts = np.repeat(left - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        indexed = self.order[starts + np.arange(total)]
+        return indexed, looked_up
+
+
+def _keys(data, precision):
+    if 'latitude' not in data.columns or 'longitude' not in data.columns:
+        raise ValueError("Both files must have 'latitude' and 'longitude' columns for merging.")
+    return coordinate_keys(data['latitude'].to_numpy(), data['longitude'].to_numpy(), precision)
+
+
+def combine_matches(primary, primary_positions, secondary):
+    """Primary rows at primary_positions side by side with the matching secondary rows."""
+    left = primary.take(primary_positions).reset_index(drop=True)
+    right = secondary.reset_index(drop=True)
+    # Same _x/_y suffixes as pd.merge for names present on both sides
+    shared = set(left.columns) & set(right.columns)
+    left.columns = [f"{c}_x" if c in shared else c for c in left.columns]
+    right.columns = [f"{c}_y" if c in shared else c for c in right.columns]
+    return pd.concat([left, right], axis=1)
+
+
+def join_on_coordinates(primary, secondary, precision=5, progress=None):
+    """
+    Inner join of primary with the secondary data on quantized latitude/longitude.
+    secondary is a DataFrame, or an iterable of DataFrame chunks (e.g. a chunked CSV reader) of
+    which only the matched rows are kept. Rows come out in primary order, like
+    pd.merge(how='inner'), with primary's coordinate columns. progress, if given, is called without
+    arguments after every chunk and returns False to cancel (the function then returns None).
+    """
+    if isinstance(secondary, pd.DataFrame):
+        # Index the secondary side and look up every primary row: output is already in primary order
+        secondary_positions, primary_positions = KeyIndex(_keys(secondary, precision)).match(_keys(primary, precision))
+        return combine_matches(primary, primary_positions,
+                       secondary.drop(columns=['latitude', 'longitude']).take(secondary_positions))
+
+    # Streaming: index the primary side and look up each secondary chunk as it is read
+    index = KeyIndex(_keys(primary, precision))
+    primary_positions, secondary_parts = [], []
+    for chunk in secondary:
+        matched_primary, matched_chunk = index.match(_keys(chunk, precision))
+        primary_positions.append(matched_primary)
+        secondary_parts.append(chunk.drop(columns=['latitude', 'longitude']).take(matched_chunk))
+        if progress is not None and progress() is False:
+            return None
+    if not secondary_parts:
+        raise ValueError("The file to merge is empty.")
+
+    primary_positions = np.concatenate(primary_positions)
+    matched = pd.concat(secondary_parts, ignore_index=True) if len(secondary_parts) > 1 else secondary_parts[0]
+    # Primary order first, then secondary file order (the concatenation order)
+    order = np.lexsort((np.arange(len(primary_positions)), primary_positions))
+    return combine_matches(primary, primary_positions[order], matched.take(order))
+
+
+def join_nearest(primary, secondary, index, max_distance_km=None):
+    """
+    Join every primary row to the nearest secondary point (index is a NearestPointIndex over
+    secondary), adding a 'distance_km' column. Each distinct primary location is queried once;
+    rows with no secondary point within max_distance_km are dropped, as in an inner join.
+    """
+    if 'latitude' not in primary.columns or 'longitude' not in primary.columns:
+        raise ValueError("Both files must have 'latitude' and 'longitude' columns for merging.")
+    latitudes = primary['latitude'].to_numpy(dtype='float64', na_value=np.nan)
+    longitudes = primary['longitude'].to_numpy(dtype='float64', na_value=np.nan)
+    codes = coordinate_codes(latitudes, longitudes)
+    # One query per distinct location (codes 0..n-1), at the coordinates of its first row
+    located = np.flatnonzero(codes >= 0)
+    _, first = np.unique(codes[located], return_index=True)
+    first_rows = located[first]
+    positions, distances = index.query(latitudes[first_rows], longitudes[first_rows], max_distance_km)
+    # Rows without coordinates (code -1) pick the unmatched entry appended at the end
+    positions = np.append(positions, -1)[codes]
+    distances = np.append(distances, np.nan)[codes]
+    matched = np.flatnonzero(positions >= 0)
+    result = combine_matches(primary, matched,
+                             secondary.drop(columns=['latitude', 'longitude']).take(positions[matched]))
+    result['distance_km'] = distances[matched]
+    return result
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: index updates are not serialized between processes
+    fcntl = None
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+DEFAULT_CACHE_DIR = os.environ.get("DM_PROJECT_CACHE_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "dm_project"))
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3  # 20 GB
+
+
+class CsvCache:
+    """
+    On-disk Parquet copies of parsed CSV files.
+    Entries are keyed on the absolute path, size and modification time of the source CSV, so an
+    edited file is simply a cache miss. The total size is capped and the least recently used
+    entries are evicted first. Without pyarrow the cache is disabled and every call is a no-op.
+    """
+
+    INDEX_FILE = "index.json"
+    LOCK_FILE = "index.lock"
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self):
+        return PARQUET_AVAILABLE
+
+    def key(self, file_path):
+        """Cache key for the current state of a CSV file."""
+        stat = os.stat(file_path)
+        identity = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def contains(self, file_path):
+        return self.enabled and os.path.exists(self.entry_path(self.key(file_path)))
+
+    def load(self, file_path, columns=None):
+        """Returns the cached DataFrame for a CSV file, or None on a miss."""
+        if not self.enabled:
+            return None
+        key = self.key(file_path)
+        path = self.entry_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = pd.read_parquet(path, columns=columns)
+        except Exception:
+            # Corrupt or partially written entry: drop it and fall back to the CSV
+            with self._index_lock():
+                index = self._read_index()
+                self._remove(key, index)
+                self._write_index(index)
+            return None
+        with self._index_lock():
+            index = self._read_index()
+            if key in index:
+                index[key]["last_access"] = time.time()
+                self._write_index(index)
+        return data
+
+    def store(self, file_path, data):
+        """Writes a parsed CSV to the cache. Returns False if the frame could not be stored."""
+        if not self.enabled:
+            return False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key = self.key(file_path)
+        path = self.entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            data.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        with self._index_lock():
+            index = self._read_index()
+            # Older versions of the same file can never be hit again
+            source = os.path.abspath(file_path)
+            for stale_key in [k for k, entry in index.items() if entry["source"] == source and k != key]:
+                self._remove(stale_key, index)
+            index[key] = {"source": source, "bytes": os.path.getsize(path), "last_access": time.time()}
+            self._evict(index)
+            self._write_index(index)
+        return True
+
+    def total_bytes(self):
+        return sum(entry["bytes"] for entry in self._read_index().values())
+
+    def clear(self):
+        """Deletes every cached entry."""
+        with self._index_lock():
+            index = self._read_index()
+            for key in list(index):
+                self._remove(key, index)
+            self._write_index(index)
+
+    def _evict(self, index):
+        """Drops least recently used entries until the cache fits in max_bytes."""
+        total = sum(entry["bytes"] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= index[key]["bytes"]
+            self._remove(key, index)
+
+    def _remove(self, key, index=None):
+        path = self.entry_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+        if index is not None:
+            index.pop(key, None)
+
+    @contextmanager
+    def _index_lock(self):
+        """
+        Exclusive lock held while the index is read, changed and written back, so that processes
+        sharing the cache (e.g. pipeline_runner --jobs) do not lose each other's entries.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, self.LOCK_FILE), "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE)) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Atomic replace so concurrent readers never see a half-written index
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as handle:
+            json.dump(index, handle)
+        os.replace(tmp_path, os.path.join(self.cache_dir, self.INDEX_FILE))
+
+
+default_cache = CsvCache()
+
+
+def read_csv_cached(file_path, cache=None):
+    """pd.read_csv that serves repeated loads of the same file from the Parquet cache."""
+    cache = cache or default_cache
+    data = cache.load(file_path)
+    if data is None:
+        data = pd.read_csv(file_path)
+        cache.store(file_path, data)
+    return data
@@ -0,0 +1,97 @@
+import os
+import pandas as pd
+from PyQt5.QtCore import QObject, pyqtSignal
+from csv_cache import default_cache
+from memory_optimizer import compact_dtypes, memory_usage, memory_report
+from sketches import DatasetSketch
+
+
+class CsvImportWorker(QObject):
+    """
+    Reads a CSV file in chunks on a worker thread.
+    Emits the first chunk as soon as it is parsed so the viewer can show a page right away,
+    reports rows/bytes read after every chunk and stops early when cancelled.
+    Files already in the Parquet cache are loaded from it in one go; freshly parsed files are added to it.
+    With compact=True the finished frame is downcast to narrower dtypes and a memory report is emitted.
+    With sketch=True mergeable quantile/distinct-count sketches are built chunk by chunk and emitted before finishing.
+    """
+    first_chunk = pyqtSignal(object)          # DataFrame holding the first chunk
+    progress = pyqtSignal('qint64', 'qint64', 'qint64')  # rows read, bytes read, total bytes
+    finished = pyqtSignal(object)             # complete DataFrame
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    status = pyqtSignal(str)                  # phase description for the progress dialog
+    compacted = pyqtSignal(str)               # before/after memory report of a compact load
+    sketched = pyqtSignal(object)             # DatasetSketch of the imported data
+
+    def __init__(self, file_path, chunk_size=200000, cache=default_cache, compact=False, sketch=False):
+        super().__init__()
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.compact = compact
+        self.sketch = DatasetSketch() if sketch else None
+        self._cancel_requested = False
+
+    def cancel(self):
+        """Asks the worker to stop after the chunk currently being parsed."""
+        self._cancel_requested = True
+
+    def run(self):
+        try:
+            total_bytes = os.path.getsize(self.file_path)
+
+            # Served from the columnar cache: no parsing, no chunking needed
+            if self.cache is not None:
+                cached = self.cache.load(self.file_path)
+                if cached is not None:
+                    self.progress.emit(len(cached), total_bytes, total_bytes)
+                    if self.sketch is not None:
+                        self.status.emit("Building approximate statistics...")
+                        self.sketched.emit(DatasetSketch.from_frame(cached))
+                    self.finished.emit(self.compact_if_requested(cached))
+                    return
+
+            chunks = []
+            rows_read = 0
+            with open(self.file_path, 'rb') as handle:
+                for chunk in pd.read_csv(handle, chunksize=self.chunk_size):
+                    if self._cancel_requested:
+                        self.cancelled.emit()
+                        return
+                    chunks.append(chunk)
+                    rows_read += len(chunk)
+                    if self.sketch is not None:
+                        self.sketch.update(chunk)
+                    if len(chunks) == 1:
+                        self.first_chunk.emit(chunk)
+                    self.progress.emit(rows_read, handle.tell(), total_bytes)
+
+            if self._cancel_requested:
+                self.cancelled.emit()
+                return
+            if not chunks:
+                # Header-only file: still hand back the (empty) columns
+                data = pd.read_csv(self.file_path)
+            else:
+                data = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+            if self.sketch is not None:
+                if not chunks:
+                    self.sketch.update(data)
+                self.sketched.emit(self.sketch)
+            if self.cache is not None:
+                self.status.emit("Writing columnar cache...")
+                self.cache.store(self.file_path, data)
+            self.finished.emit(self.compact_if_requested(data))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def compact_if_requested(self, data):
+        """Downcasts the loaded frame when a compact load was requested."""
+        if not self.compact:
+            return data
+        self.status.emit("Optimizing column types...")
+        before = memory_usage(data)
+        data, changes = compact_dtypes(data)
+        self.compacted.emit(memory_report(before, memory_usage(data), changes))
+        return data
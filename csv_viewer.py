@@ -1,9 +1,11 @@
+import os
 import sys
+import tempfile
 import pandas as pd
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QPushButton, QWidget, QTableWidget,
-                             QTableWidgetItem, QLabel, QHBoxLayout, QInputDialog, QMessageBox, QSplitter)
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QIcon
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QPushButton, QWidget, QTableView,
+                             QAbstractItemView, QLabel, QHBoxLayout, QInputDialog, QMessageBox, QSplitter, QProgressBar, QShortcut)
+from PyQt5.QtCore import Qt, QModelIndex, QMimeData, QUrl
+from PyQt5.QtGui import QFont, QIcon, QKeySequence
 from data_manipulation_dialog import DataManipulationDialog
 from data_cleaning_dialog import DataCleaningDialog
 from data_normalization_dialog import DataNormalizationDialog
@@ -11,6 +13,18 @@ from data_aggregation_dialog import DataAggregationDialog
 from data_discretization_dialog import DataDiscretizationDialog
 from data_visualization_dialog import DataVisualizationDialog
 from data_merger_dialog import DataMergerDialog
+from data_frame_model import DataFrameModel
+from outlier_stats import OutlierStatistics
+from column_stats import ColumnStatistics
+from sketches import SketchCache
+from histogram_cache import HistogramCache
+from task_runner import TaskRunner, accepts_argument
+from history import DataHistory
+from lazy_plan import LazyPlan
+from data_export import selection_to_tsv, write_selection_tsv
+
+# Larger selections are written to a temporary file instead of the clipboard
+CLIPBOARD_CELL_LIMIT = 2000000
 
 
 
@@ -22,15 +36,77 @@ class CsvViewer(QMainWindow):
         self.setGeometry(100, 100, 1000, 600)
         self.setWindowIcon(QIcon("Cloud.jpeg"))  # Replace "Cloud.jpeg" with the path to your logo file
 
+        # Dataset version, bumped on every change so statistics caches know when they are stale
+        self.data_version = 0
+        self.outlier_stats = OutlierStatistics()
+        self.column_stats = ColumnStatistics()
+        self.sketches = SketchCache()
+        self.histograms = HistogramCache()
+
+        # Heavy operations run here, off the GUI thread, one after the other
+        self.task_runner = TaskRunner(self)
+
+        # Undo/redo of dataset versions, sharing unchanged columns between versions
+        self.history = DataHistory(max_steps=10)
+
         # Initialize variables for pagination
         self.full_data = None
         self.chunk_size = 1000
         self.current_page = 0
         self.total_pages = 0
 
+        # Import options shared by every Data Manipulation dialog
+        self.compact_load = False
+        # Sketch-based (approximate) quantiles and unique counts for very large datasets
+        self.approximate_stats = False
+        # Aggregations run in one process per core over spatial tiles
+        self.parallel_aggregation = False
+        # In lazy mode operations are recorded in a plan and executed together by run_plan()
+        self.lazy_mode = False
+        self.plan = LazyPlan()
+        # Last fitted normalization parameters, reusable on other files
+        self.normalizer = None
+
         # Initialize UI
         self.init_ui()
 
+    @property
+    def full_data(self):
+        return self._full_data
+
+    @full_data.setter
+    def full_data(self, data):
+        self.replace_data(data)
+
+    def replace_data(self, data, record_history=True):
+        """Sets full_data, bumps the dataset version and records an undo step unless told not to."""
+        self._full_data = data
+        self.data_version += 1
+        if record_history:
+            self.history.record(data)
+        self.update_history_buttons()
+
+    def undo(self):
+        """Restores the previous dataset version."""
+        self.restore_version(self.history.undo())
+
+    def redo(self):
+        """Re-applies the dataset version that was undone last."""
+        self.restore_version(self.history.redo())
+
+    def restore_version(self, data):
+        if data is None:
+            return
+        self.replace_data(data, record_history=False)
+        self.current_page = 0
+        self.update_total_pages()
+        self.display_data()
+
+    def update_history_buttons(self):
+        if hasattr(self, 'undo_button'):
+            self.undo_button.setEnabled(self.history.can_undo())
+            self.redo_button.setEnabled(self.history.can_redo())
+
     def init_ui(self):
         main_layout = QHBoxLayout()
         splitter = QSplitter(Qt.Horizontal)
@@ -53,6 +129,30 @@ class CsvViewer(QMainWindow):
             button.clicked.connect(func)
             button.setFixedHeight(40)
             sidebar_layout.addWidget(button)
+
+        # Undo/redo of dataset changes
+        self.undo_button = QPushButton("Undo")
+        self.undo_button.clicked.connect(self.undo)
+        self.redo_button = QPushButton("Redo")
+        self.redo_button.clicked.connect(self.redo)
+        for button in (self.undo_button, self.redo_button):
+            button.setFixedHeight(40)
+            button.setEnabled(False)
+            sidebar_layout.addWidget(button)
+        QShortcut(QKeySequence.Undo, self, activated=self.undo)
+        QShortcut(QKeySequence.Redo, self, activated=self.redo)
+
+        # Lazy mode: record operations, then run them in one pass
+        self.lazy_button = QPushButton("Lazy Mode")
+        self.lazy_button.setCheckable(True)
+        self.lazy_button.toggled.connect(self.toggle_lazy_mode)
+        self.run_plan_button = QPushButton("Run Plan")
+        self.run_plan_button.clicked.connect(self.run_plan)
+        self.run_plan_button.setEnabled(False)
+        for button in (self.lazy_button, self.run_plan_button):
+            button.setFixedHeight(40)
+            sidebar_layout.addWidget(button)
+
         sidebar.setLayout(sidebar_layout)
         sidebar.setFixedWidth(200)
         sidebar_layout.addStretch()
@@ -60,9 +160,11 @@ class CsvViewer(QMainWindow):
         # Data display area
         data_display_area = QWidget()
         data_layout = QVBoxLayout(data_display_area)
-        self.table = QTableWidget()
-        self.table.setSelectionBehavior(QTableWidget.SelectItems)  # Allows cell-by-cell selection
-        self.table.setSelectionMode(QTableWidget.ExtendedSelection)  # Allows multi-cell selection
+        self.table = QTableView()
+        self.table_model = DataFrameModel(self)
+        self.table.setModel(self.table_model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectItems)  # Allows cell-by-cell selection
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)  # Allows multi-cell selection
         data_layout.addWidget(self.table)
 
         # Pagination controls
@@ -82,6 +184,12 @@ class CsvViewer(QMainWindow):
         self.jump_button.clicked.connect(self.go_to_page)
         nav_layout.addWidget(self.jump_button)
 
+        # Continuous scrolling over the whole dataset instead of 1000-row pages
+        self.scroll_all_button = QPushButton("Scroll All Rows")
+        self.scroll_all_button.setCheckable(True)
+        self.scroll_all_button.toggled.connect(self.toggle_scroll_all)
+        nav_layout.addWidget(self.scroll_all_button)
+
         self.page_label = QLabel("Page: 0/0")
         nav_layout.addWidget(self.page_label)
         data_layout.addLayout(nav_layout)
@@ -94,27 +202,190 @@ class CsvViewer(QMainWindow):
         container = QWidget()
         container.setLayout(main_layout)
         self.setCentralWidget(container)
+
+        # Status bar showing the running task, its progress and a cancel button
+        self.task_label = QLabel("")
+        self.task_progress = QProgressBar()
+        self.task_progress.setRange(0, 1000)
+        self.task_progress.setFixedWidth(200)
+        self.cancel_task_button = QPushButton("Cancel")
+        self.cancel_task_button.clicked.connect(self.task_runner.cancel_current)
+        for widget in (self.task_label, self.task_progress, self.cancel_task_button):
+            self.statusBar().addPermanentWidget(widget)
+            widget.setVisible(False)
+        self.task_runner.task_started.connect(self.on_task_started)
+        self.task_runner.task_progress.connect(self.on_task_progress)
+        self.task_runner.idle.connect(self.on_tasks_idle)
         self.apply_styles()
+    def toggle_lazy_mode(self, checked):
+        self.lazy_mode = checked
+        # Leaving lazy mode applies what was recorded
+        if not checked:
+            self.run_plan()
+
+    def run_or_record(self, step, title, fn, *args, on_done=None, **kwargs):
+        """In lazy mode, appends step (a lazy_plan step) to the plan; otherwise runs fn like run_data_task."""
+        if self.lazy_mode:
+            if self.full_data is None:
+                QMessageBox.warning(self, "No Data", "Please import a dataset first.")
+                return None
+            self.plan = self.plan.then(step)
+            self.update_plan_button()
+            return None
+        return self.run_data_task(title, fn, *args, on_done=on_done, **kwargs)
+
+    def run_plan(self):
+        """Executes the recorded plan on full_data as one task and displays the result."""
+        if not len(self.plan):
+            return None
+        plan = self.plan
+        self.discard_plan()
+
+        def on_done(result):
+            if result[1]:
+                QMessageBox.information(self, "Plan Executed", "\n".join(result[1]))
+
+        return self.run_data_task(f"Running {len(plan)} planned operations", plan.execute, on_done=on_done)
+
+    def discard_plan(self):
+        self.plan = LazyPlan()
+        self.update_plan_button()
+
+    def update_plan_button(self):
+        count = len(self.plan)
+        self.run_plan_button.setText(f"Run Plan ({count})" if count else "Run Plan")
+        self.run_plan_button.setToolTip("\n".join(self.plan.titles()))
+        self.run_plan_button.setEnabled(count > 0)
+
+    def run_data_task(self, title, fn, *args, on_done=None, **kwargs):
+        """
+        Queue fn(full_data, *args, **kwargs) on the task runner.
+        The dataset is read when the task starts (so queued operations chain), and the returned
+        DataFrame, or the first item of a returned tuple, replaces full_data in one step on the GUI
+        thread before on_done(result) is called. fn also receives data_version if it accepts it.
+        """
+        return self._submit_replacing_task(title, fn, args, kwargs, on_done, with_data=True)
+
+    def run_task(self, title, fn, *args, on_done=None, **kwargs):
+        """Like run_data_task, for operations that produce a new dataset without reading the current one."""
+        return self._submit_replacing_task(title, fn, args, kwargs, on_done, with_data=False)
+
+    def run_background_task(self, title, fn, *args, on_done=None, **kwargs):
+        """
+        Queue fn(full_data, *args, **kwargs) for operations that only read the dataset (e.g. export):
+        the dataset is read when the task starts and on_done(result) is called, full_data is left as is.
+        A pending plan is run first, so the result of the recorded operations is what gets read.
+        """
+        self.run_plan()
+
+        def on_start(task):
+            if self.full_data is None:
+                raise ValueError("Please import a dataset first.")
+            task.args = (self.full_data,) + task.args
+
+        def on_error(message):
+            QMessageBox.warning(self, "Operation Failed", f"{title} failed: {message}")
+
+        return self.task_runner.submit(title, fn, *args, on_start=on_start, on_success=on_done,
+                                       on_error=on_error, **kwargs)
+
+    def _submit_replacing_task(self, title, fn, args, kwargs, on_done, with_data):
+        # Operations that cannot be recorded apply after the ones already in the plan
+        self.run_plan()
+        started_version = {}
+
+        def on_start(task):
+            if with_data:
+                if self.full_data is None:
+                    raise ValueError("Please import a dataset first.")
+                task.args = (self.full_data,) + task.args
+                if accepts_argument(fn, 'data_version'):
+                    task.kwargs['data_version'] = self.data_version
+            started_version['value'] = self.data_version
+
+        def on_success(result):
+            data = result[0] if isinstance(result, tuple) else result
+            if with_data and self.data_version != started_version['value']:
+                QMessageBox.warning(self, "Result Discarded",
+                                    f"The dataset changed while '{title}' was running, so its result was discarded.")
+                return
+            self.full_data = data
+            self.current_page = 0
+            self.update_total_pages()
+            self.display_data()
+            if on_done is not None:
+                on_done(result)
+
+        def on_error(message):
+            QMessageBox.warning(self, "Operation Failed", f"{title} failed: {message}")
+
+        return self.task_runner.submit(title, fn, *args, on_start=on_start, on_success=on_success,
+                                       on_error=on_error, **kwargs)
+
+    def on_task_started(self, title):
+        queued = self.task_runner.pending_count() - 1
+        self.task_label.setText(f"{title}..." + (f" ({queued} queued)" if queued > 0 else ""))
+        self.task_progress.setRange(0, 0)  # Busy indicator until the task reports progress
+        for widget in (self.task_label, self.task_progress, self.cancel_task_button):
+            widget.setVisible(True)
+
+    def on_task_progress(self, fraction, message):
+        self.task_progress.setRange(0, 1000)
+        self.task_progress.setValue(int(min(max(fraction, 0.0), 1.0) * 1000))
+        if message:
+            self.task_label.setText(message)
+
+    def on_tasks_idle(self):
+        for widget in (self.task_label, self.task_progress, self.cancel_task_button):
+            widget.setVisible(False)
+
+    def selected_blocks(self):
+        """
+        Selected ranges as (row start, row stop, column positions) blocks of full_data.
+        Fully selected columns (header clicks, select all) cover every row of the dataset, not
+        just the page on screen, and are combined side by side into one block.
+        """
+        selection_model = self.table.selectionModel()
+        offset = self.table_model.row_offset()
+        blocks, whole_columns = [], []
+        for range_ in selection_model.selection():
+            columns = list(range(range_.left(), range_.right() + 1))
+            if all(selection_model.isColumnSelected(column, QModelIndex()) for column in columns):
+                whole_columns.extend(columns)
+            else:
+                blocks.append((offset + range_.top(), offset + range_.bottom() + 1, columns))
+        if whole_columns:
+            blocks.insert(0, (0, len(self.full_data), sorted(set(whole_columns))))
+        return blocks
+
     def copy_selection(self):
-        """Copies selected cells to the clipboard."""
-        selected_ranges = self.table.selectedRanges()
-        if not selected_ranges:
+        """Copies selected cells to the clipboard as tab-separated text."""
+        if self.full_data is None or self.table.selectionModel().selection().isEmpty():
             QMessageBox.warning(self, "No Selection", "Please select a section of the data to copy.")
             return
 
-        selected_data = ""
-        for range_ in selected_ranges:
-            for row in range(range_.topRow(), range_.bottomRow() + 1):
-                row_data = []
-                for col in range(range_.leftColumn(), range_.rightColumn() + 1):
-                    item = self.table.item(row, col)
-                    row_data.append(item.text() if item else "")
-                selected_data += "\t".join(row_data) + "\n"
+        blocks = self.selected_blocks()
+        cells = sum((stop - start) * len(columns) for start, stop, columns in blocks)
+        if cells <= CLIPBOARD_CELL_LIMIT:
+            QApplication.clipboard().setText(selection_to_tsv(self.full_data, blocks))
+            QMessageBox.information(self, "Copy Complete", "Selected data has been copied to the clipboard.")
+            return
 
-        # Copy to clipboard
-        clipboard = QApplication.clipboard()
-        clipboard.setText(selected_data)
-        QMessageBox.information(self, "Copy Complete", "Selected data has been copied to the clipboard.")
+        # Too large for the clipboard: stream it to a temporary file in the background and copy its location
+        handle, path = tempfile.mkstemp(prefix="selection_", suffix=".tsv")
+        os.close(handle)
+        self.task_runner.submit("Copying selection", write_selection_tsv, self.full_data, blocks, path,
+                                on_success=self.copy_selection_file,
+                                on_error=lambda message: QMessageBox.warning(self, "Operation Failed", f"Copying selection failed: {message}"))
+
+    def copy_selection_file(self, path):
+        mime_data = QMimeData()
+        mime_data.setText(path)
+        mime_data.setUrls([QUrl.fromLocalFile(path)])
+        QApplication.clipboard().setMimeData(mime_data)
+        QMessageBox.information(self, "Copy Complete",
+                                f"The selection is too large for the clipboard and was saved to:\n{path}\n\n"
+                                "The file has been copied to the clipboard.")
 
     def apply_styles(self):
         self.setStyleSheet("""
@@ -132,7 +403,7 @@ class CsvViewer(QMainWindow):
             QPushButton:hover {
                 background-color: #3b2a4e;
             }
-            QTableWidget {
+            QTableView {
                 background-color: #1a1a1a;
                 color: #ffffff;
                 font-size: 13px;
@@ -194,24 +465,26 @@ class CsvViewer(QMainWindow):
         if self.full_data is None:
             return
 
-        # Define start and end row indices for the current page
-        start_row = self.current_page * self.chunk_size
-        end_row = min(start_row + self.chunk_size, len(self.full_data))
-        chunk = self.full_data.iloc[start_row:end_row]
+        # Define start and end row indices for the current page (or the whole dataset when scrolling)
+        if self.scroll_all_button.isChecked():
+            start_row, end_row = 0, len(self.full_data)
+        else:
+            start_row = self.current_page * self.chunk_size
+            end_row = min(start_row + self.chunk_size, len(self.full_data))
 
-        # Update table with continuous row indices
-        self.table.setRowCount(chunk.shape[0])
-        self.table.setColumnCount(chunk.shape[1])
-        self.table.setHorizontalHeaderLabels(chunk.columns)
-
-        for i, (index, row) in enumerate(chunk.iterrows()):
-            for j, value in enumerate(row):
-                self.table.setItem(i, j, QTableWidgetItem(str(value)))
-            self.table.setVerticalHeaderItem(i, QTableWidgetItem(str(index + 1)))  # Set continuous row index
+        # The model formats cells lazily, only for the rows the view paints
+        self.table_model.set_data(self.full_data, start_row, end_row)
 
         self.update_total_pages()
-        self.prev_button.setEnabled(self.current_page > 0)
-        self.next_button.setEnabled(self.current_page < self.total_pages - 1)
+        paging = not self.scroll_all_button.isChecked()
+        self.prev_button.setEnabled(paging and self.current_page > 0)
+        self.next_button.setEnabled(paging and self.current_page < self.total_pages - 1)
+        self.jump_button.setEnabled(paging)
+
+    def toggle_scroll_all(self, checked):
+        """Switches between paged display and continuous scrolling over all rows."""
+        self.current_page = 0
+        self.display_data()
 
     def load_previous_page(self):
         if self.current_page > 0:
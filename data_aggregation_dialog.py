@@ -1,5 +1,13 @@
-import pandas as pd
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QMessageBox
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QMessageBox, QInputDialog, QCheckBox, QDialogButtonBox, QLabel
+import data_operations
+import lazy_plan
+from data_operations import SEASON_CALENDARS, DEFAULT_SEASON_CALENDAR
+from resampling import FREQUENCIES, AGGREGATES, value_columns
+from parallel_groupby import default_workers
+from memory_optimizer import available_memory
+
+# Ask before a seasonal pivot whose estimated size exceeds this share of the free memory
+PIVOT_MEMORY_SHARE = 0.5
 
 class DataAggregationDialog(QDialog):
     def __init__(self, parent=None):
@@ -16,108 +24,165 @@ class DataAggregationDialog(QDialog):
         self.monthly_button.clicked.connect(self.aggregate_monthly)
         layout.addWidget(self.monthly_button)
 
+        # Resampling at any frequency with several aggregates at once
+        self.resample_button = QPushButton("Resample Time Series...")
+        self.resample_button.clicked.connect(self.resample_time_series)
+        layout.addWidget(self.resample_button)
+
         # Seasonal aggregation button
         self.seasonal_button = QPushButton("Aggregate Seasonally")
         self.seasonal_button.clicked.connect(self.aggregate_seasonally)
         layout.addWidget(self.seasonal_button)
+        # Aggregate spatial tiles in worker processes (one per core)
+        self.parallel_checkbox = QCheckBox(f"Parallel processing ({default_workers()} cores)")
+        self.parallel_checkbox.setChecked(self.parent.parallel_aggregation)
+        self.parallel_checkbox.toggled.connect(self.set_parallel_aggregation)
+        layout.addWidget(self.parallel_checkbox)
          # Add a button for the new reduction option
         self.reduction_button = QPushButton("Reduce Data by Season")
         self.reduction_button.clicked.connect(self.reduce_data_by_season)
         layout.addWidget(self.reduction_button)
         # Set dialog layout
         self.setLayout(layout)
+    def set_parallel_aggregation(self, checked):
+        self.parent.parallel_aggregation = checked
+
+    def workers(self):
+        return None if self.parent.parallel_aggregation else 1
+
     def reduce_data_by_season(self):
-        if self.parent.full_data is not None:
-            try:
-                # Pivot the data based on 'latitude', 'longitude', and 'season'
-                pivot_df = self.parent.full_data.pivot(index=['latitude', 'longitude'], 
-                                                       columns='season',
-                                                       values=['PSurf', 'Qair', 'Rainf', 'Snowf', 'Tair', 'Wind'])
-
-                # Flatten the MultiIndex columns
-                pivot_df.columns = [f"{var}{season}" for var, season in pivot_df.columns]
-                
-                # Reset index to make it compatible with the main data frame
-                pivot_df.reset_index(inplace=True)
-
-                # Update the main data with the reduced form
-                self.parent.full_data = pivot_df
-                self.parent.current_page = 0
-                self.parent.update_total_pages()
-                self.parent.display_data()
-
-                QMessageBox.information(self, "Reduction Complete", "Data has been reduced by season and displayed.")
-            except Exception as e:
-                QMessageBox.warning(self, "Reduction Error", f"An error occurred during data reduction: {e}")
-        else:
+        if self.parent.full_data is None:
             QMessageBox.warning(self, "No Data", "Please import a dataset first.")
-    def ensure_datetime(self):
-        """Ensure that the 'time' column is in datetime format."""
-        if 'time' in self.parent.full_data.columns:
-            self.parent.full_data['time'] = pd.to_datetime(self.parent.full_data['time'], errors='coerce')
-            if self.parent.full_data['time'].isnull().any():
-                QMessageBox.warning(self, "Date Conversion Error", "Some 'time' values could not be converted to datetime.")
-                self.parent.full_data.dropna(subset=['time'], inplace=True)
-            return True
-        else:
-            QMessageBox.warning(self, "Missing 'time' Column", "The data must have a 'time' column in datetime format.")
+            return
+        if self.parent.lazy_mode and len(self.parent.plan):
+            # The columns are only known once the plan has run: record the default variables
+            self.parent.run_or_record(lazy_plan.reduce_by_season_step(), "Reducing data by season",
+                                      data_operations.reduce_by_season)
+            return
+        data = self.parent.full_data
+        if not {'latitude', 'longitude', 'season'}.issubset(data.columns):
+            QMessageBox.warning(self, "Missing Columns", "Data must contain 'latitude', 'longitude', and 'season' columns for this reduction.")
+            return
+
+        candidates = [c for c in value_columns(data) if c != 'season']
+        defaults = data_operations.season_pivot_values(data)
+        values = self.choose_items("Variables", "Columns spread into one column per season:", candidates, defaults)
+        if values is None:
+            return
+        aggregate, ok = QInputDialog.getItem(self, "Repeated Rows", "Combine rows repeating a (latitude, longitude, season) with:",
+                                             list(AGGREGATES), 0, False)
+        if not ok:
+            return
+
+        # The output size is estimated from the grouped codes before the wide result is built
+        self.parent.run_background_task(
+            "Estimating seasonal reduction", data_operations.estimate_season_pivot, values,
+            on_done=lambda estimate: self.run_season_reduction(values, aggregate, estimate))
+
+    def run_season_reduction(self, values, aggregate, estimate):
+        rows, columns, size = estimate
+        available = available_memory()
+        if available is not None and size > PIVOT_MEMORY_SHARE * available:
+            answer = QMessageBox.question(
+                self.parent, "Large Result",
+                f"The reduced data will have {rows:,} rows and {columns:,} columns (about {size / 1e6:,.0f} MB), "
+                f"with {available / 1e6:,.0f} MB of memory free. Continue?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                return
+        self.parent.run_or_record(
+            lazy_plan.reduce_by_season_step(values, aggregate), "Reducing data by season",
+            data_operations.reduce_by_season, values, aggregate,
+            on_done=lambda data: QMessageBox.information(self.parent, "Reduction Complete", "Data has been reduced by season and displayed."))
+
+    def aggregation_task(self, data, aggregate, *args):
+        """Runs on the task runner: returns (aggregated data, rows dropped for unparseable 'time' values)."""
+        data, invalid = data_operations.ensure_datetime(data)
+        return aggregate(data, *args), invalid
+
+    def show_aggregation_result(self, result, message):
+        if result[1]:
+            QMessageBox.warning(self.parent, "Date Conversion Error", "Some 'time' values could not be converted to datetime.")
+        QMessageBox.information(self.parent, "Aggregation Complete", message)
+
+    def has_aggregation_columns(self):
+        """Check that the columns needed for aggregation are present."""
+        if not {'time', 'latitude', 'longitude'}.issubset(self.parent.full_data.columns):
+            QMessageBox.warning(self, "Missing Columns", "Data must contain 'time', 'latitude', and 'longitude' columns for aggregation.")
             return False
+        return True
 
     def aggregate_monthly(self):
         if self.parent.full_data is not None:
-            # Check if required columns are present
-            if not {'time', 'latitude', 'longitude'}.issubset(self.parent.full_data.columns):
-                QMessageBox.warning(self, "Missing Columns", "Data must contain 'time', 'latitude', and 'longitude' columns for aggregation.")
-                return
-
-            if not self.ensure_datetime():
+            if not self.has_aggregation_columns():
                 return
-            
-            # Extract year-month for monthly grouping
-            self.parent.full_data['year_month'] = self.parent.full_data['time'].dt.to_period('M')
 
-            # Perform monthly aggregation
-            monthly_data = self.parent.full_data.groupby(['latitude', 'longitude', 'year_month']).mean(numeric_only=True).reset_index()
+            # Perform monthly aggregation over year-month periods
+            self.parent.run_or_record(
+                lazy_plan.aggregate_monthly_step(self.workers()), "Aggregating monthly", self.aggregation_task,
+                data_operations.aggregate_monthly, self.workers(),
+                on_done=lambda result: self.show_aggregation_result(result, "Data has been aggregated monthly and displayed."))
 
-            # Update the parent data with the aggregated data
-            self.parent.full_data = monthly_data
-            self.parent.current_page = 0
-            self.parent.update_total_pages()
-            self.parent.display_data()
+    def aggregate_seasonally(self):
+        if self.parent.full_data is not None:
+            if not self.has_aggregation_columns():
+                return
 
-            QMessageBox.information(self, "Aggregation Complete", "Data has been aggregated monthly and displayed.")
+            # Choose the season calendar (official astronomical boundaries by default)
+            calendars = list(SEASON_CALENDARS)
+            calendar, ok = QInputDialog.getItem(self, "Season Calendar", "Choose season calendar:",
+                                                calendars, calendars.index(DEFAULT_SEASON_CALENDAR), False)
+            if not ok:
+                return
 
-    def aggregate_seasonally(self):
+            # Map precise date ranges to seasons and perform seasonal aggregation
+            self.parent.run_or_record(
+                lazy_plan.aggregate_seasonally_step(calendar, self.workers()), "Aggregating seasonally", self.aggregation_task,
+                data_operations.aggregate_seasonally, calendar, self.workers(),
+                on_done=lambda result: self.show_aggregation_result(
+                    result, "Data has been aggregated seasonally based on precise boundaries and displayed."))
+
+    def choose_items(self, title, label, items, checked):
+        """Checkbox list of items; returns the checked ones, or None if cancelled or nothing is checked."""
+        dialog = QDialog(self)
+        dialog.setWindowTitle(title)
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel(label))
+        checkboxes = {}
+        for item in items:
+            checkboxes[item] = QCheckBox(str(item))
+            checkboxes[item].setChecked(item in checked)
+            layout.addWidget(checkboxes[item])
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+        if dialog.exec_() != QDialog.Accepted:
+            return None
+        return [item for item, checkbox in checkboxes.items() if checkbox.isChecked()] or None
+
+    def choose_aggregates(self):
+        """Asks which aggregates to compute; returns None if cancelled or nothing is selected."""
+        return self.choose_items("Aggregates", "Statistics computed for every numeric column:", AGGREGATES, ['mean'])
+
+    def resample_time_series(self):
         if self.parent.full_data is not None:
-            # Check if required columns are present
-            if not {'time', 'latitude', 'longitude'}.issubset(self.parent.full_data.columns):
-                QMessageBox.warning(self, "Missing Columns", "Data must contain 'time', 'latitude', and 'longitude' columns for aggregation.")
+            if not self.has_aggregation_columns():
                 return
 
-            if not self.ensure_datetime():
+            frequencies = list(FREQUENCIES)
+            frequency, ok = QInputDialog.getItem(self, "Resampling Frequency", "Choose the period length:",
+                                                 frequencies, frequencies.index('Monthly'), False)
+            if not ok:
+                return
+            aggregates = self.choose_aggregates()
+            if aggregates is None:
                 return
 
-            # Define the official seasonal boundaries
-            def get_season(date):
-                if date >= pd.Timestamp(f"{date.year}-12-21") or date < pd.Timestamp(f"{date.year}-03-21"):
-                    return 'Winter'
-                elif pd.Timestamp(f"{date.year}-03-21") <= date < pd.Timestamp(f"{date.year}-06-21"):
-                    return 'Spring'
-                elif pd.Timestamp(f"{date.year}-06-21") <= date < pd.Timestamp(f"{date.year}-09-23"):
-                    return 'Summer'
-                elif pd.Timestamp(f"{date.year}-09-23") <= date < pd.Timestamp(f"{date.year}-12-21"):
-                    return 'Fall'
-
-            # Map precise date ranges to seasons and add a 'season' column
-            self.parent.full_data['season'] = self.parent.full_data['time'].apply(get_season)
-
-            # Perform seasonal aggregation
-            seasonal_data = self.parent.full_data.groupby(['latitude', 'longitude', 'season']).mean(numeric_only=True).reset_index()
-
-            # Update the parent data with the aggregated data
-            self.parent.full_data = seasonal_data
-            self.parent.current_page = 0
-            self.parent.update_total_pages()
-            self.parent.display_data()
-
-            QMessageBox.information(self, "Aggregation Complete", "Data has been aggregated seasonally based on precise boundaries and displayed.")
+            # Every aggregate of every column comes from one sort of the rows by (cell, period)
+            self.parent.run_or_record(
+                lazy_plan.resample_step(FREQUENCIES[frequency], aggregates, self.workers()), "Resampling",
+                self.aggregation_task, data_operations.resample_time_series, FREQUENCIES[frequency], aggregates,
+                self.workers(),
+                on_done=lambda result: self.show_aggregation_result(
+                    result, f"Data has been resampled ({frequency.lower()}) and displayed."))
@@ -1,5 +1,7 @@
 from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QMessageBox
 import pandas as pd
+import data_operations
+import lazy_plan
 
 class DataCleaningDialog(QDialog):
     def __init__(self, parent=None):
@@ -35,85 +37,72 @@ class DataCleaningDialog(QDialog):
 
         self.setLayout(layout)
 
-    def calculate_outliers(self):
-        """Calculate outliers based on IQR for each numeric column."""
-        columns_to_check = self.parent.full_data.select_dtypes(include=['float64', 'int64']).columns
-        Q1 = self.parent.full_data[columns_to_check].quantile(0.25)
-        Q3 = self.parent.full_data[columns_to_check].quantile(0.75)
-        IQR = Q3 - Q1
-        outliers = (self.parent.full_data[columns_to_check] < (Q1 - 1.5 * IQR)) | (self.parent.full_data[columns_to_check] > (Q3 + 1.5 * IQR))
-        return outliers
+    def calculate_outliers(self, data, data_version):
+        """
+        IQR fences, percentiles, mean and median of every numeric column.
+        Computed in one pass and cached on the viewer until the dataset changes; in approximate
+        mode the percentiles come from the dataset sketches instead of a full partition.
+        """
+        if self.parent.approximate_stats:
+            return self.parent.sketches.get(data, data_version).outlier_statistics(data)
+        return self.parent.outlier_stats.get(data, data_version)
+
+    def approximation_note(self):
+        """Error bounds appended to result messages when approximate statistics are used."""
+        if self.parent.approximate_stats and self.parent.sketches.sketch is not None:
+            return "\n\n" + self.parent.sketches.sketch.error_note()
+        return ""
+
+    def clean_outliers_task(self, data, method, data_version):
+        """Runs on the task runner: outlier handling with the cached statistics."""
+        return data_operations.clean_outliers(data, method, self.calculate_outliers(data, data_version))
 
     def remove_outliers(self):
         """Removes rows with outliers based on IQR."""
         if self.parent.full_data is not None:
-            outliers = self.calculate_outliers()
-            self.parent.full_data = self.parent.full_data[~outliers.any(axis=1)]
-            self.parent.current_page = 0
-            self.parent.update_total_pages()
-            self.parent.display_data()
-            QMessageBox.information(self, "Outliers Removed", f"Outliers removed. Remaining rows: {len(self.parent.full_data)}.")
+            self.parent.run_or_record(
+                lazy_plan.clean_outliers_step('remove'), "Removing outliers", self.clean_outliers_task, 'remove',
+                on_done=lambda data: QMessageBox.information(self.parent, "Outliers Removed", f"Outliers removed. Remaining rows: {len(data)}." + self.approximation_note()))
         else:
             QMessageBox.warning(self, "No Data", "Please import a dataset first.")
 
     def replace_outliers_with_mean(self):
         """Replaces outlier values with the column mean."""
         if self.parent.full_data is not None:
-            outliers = self.calculate_outliers()
-            for column in outliers.columns:
-                mean_value = self.parent.full_data[column].mean()
-                self.parent.full_data.loc[outliers[column], column] = mean_value
-
-            self.parent.current_page = 0
-            self.parent.update_total_pages()
-            self.parent.display_data()
-            QMessageBox.information(self, "Outliers Replaced", "Outliers have been replaced with the column mean.")
+            self.parent.run_or_record(
+                lazy_plan.clean_outliers_step('mean'), "Replacing outliers with mean", self.clean_outliers_task, 'mean',
+                on_done=lambda data: QMessageBox.information(self.parent, "Outliers Replaced", "Outliers have been replaced with the column mean." + self.approximation_note()))
         else:
             QMessageBox.warning(self, "No Data", "Please import a dataset first.")
 
     def replace_outliers_with_median(self):
         """Replaces outlier values with the column median."""
         if self.parent.full_data is not None:
-            outliers = self.calculate_outliers()
-            for column in outliers.columns:
-                median_value = self.parent.full_data[column].median()
-                self.parent.full_data.loc[outliers[column], column] = median_value
-
-            self.parent.current_page = 0
-            self.parent.update_total_pages()
-            self.parent.display_data()
-            QMessageBox.information(self, "Outliers Replaced", "Outliers have been replaced with the column median.")
+            self.parent.run_or_record(
+                lazy_plan.clean_outliers_step('median'), "Replacing outliers with median", self.clean_outliers_task, 'median',
+                on_done=lambda data: QMessageBox.information(self.parent, "Outliers Replaced", "Outliers have been replaced with the column median." + self.approximation_note()))
         else:
             QMessageBox.warning(self, "No Data", "Please import a dataset first.")
 
     def cap_outliers(self):
         """Caps outliers to the 5th and 95th percentiles."""
         if self.parent.full_data is not None:
-            columns_to_check = self.parent.full_data.select_dtypes(include=['float64', 'int64']).columns
-            lower_bound = self.parent.full_data[columns_to_check].quantile(0.05)
-            upper_bound = self.parent.full_data[columns_to_check].quantile(0.95)
-
-            for column in columns_to_check:
-                self.parent.full_data[column] = self.parent.full_data[column].clip(lower=lower_bound[column], upper=upper_bound[column])
-
-            self.parent.current_page = 0
-            self.parent.update_total_pages()
-            self.parent.display_data()
-            QMessageBox.information(self, "Outliers Capped", "Outliers have been capped to the 5th and 95th percentiles.")
+            self.parent.run_or_record(
+                lazy_plan.clean_outliers_step('cap'), "Capping outliers", self.clean_outliers_task, 'cap',
+                on_done=lambda data: QMessageBox.information(self.parent, "Outliers Capped", "Outliers have been capped to the 5th and 95th percentiles." + self.approximation_note()))
         else:
             QMessageBox.warning(self, "No Data", "Please import a dataset first.")
 
+    def remove_nan_rows_task(self, data):
+        """Runs on the task runner: returns (cleaned data, number of removed rows)."""
+        cleaned = data_operations.remove_nan_rows(data)
+        return cleaned, len(data) - len(cleaned)
+
     def remove_nan_rows(self):
         """Removes rows containing NaN values."""
         if self.parent.full_data is not None:
-            initial_rows = len(self.parent.full_data)
-            self.parent.full_data = self.parent.full_data.dropna()
-            final_rows = len(self.parent.full_data)
-            removed_rows = initial_rows - final_rows
-
-            self.parent.current_page = 0
-            self.parent.update_total_pages()
-            self.parent.display_data()
-            QMessageBox.information(self, "NaN Rows Removed", f"{removed_rows} rows with NaN values have been removed.")
+            self.parent.run_or_record(
+                lazy_plan.remove_nan_rows_step(), "Removing rows with NaN", self.remove_nan_rows_task,
+                on_done=lambda result: QMessageBox.information(self.parent, "NaN Rows Removed", f"{result[1]} rows with NaN values have been removed."))
         else:
             QMessageBox.warning(self, "No Data", "Please import a dataset first.")
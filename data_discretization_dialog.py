@@ -1,5 +1,7 @@
 from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QMessageBox, QInputDialog
-import pandas as pd
+import data_operations
+import lazy_plan
+from data_operations import DISCRETIZATION_LABELS
 
 class DataDiscretizationDialog(QDialog):
     def __init__(self, parent=None):
@@ -29,56 +31,32 @@ class DataDiscretizationDialog(QDialog):
         Excludes 'latitude', 'longitude', and 'geometry' columns, but includes an 'All Numerical Columns' option.
         """
         if self.parent.full_data is not None:
-            numerical_columns = self.parent.full_data.select_dtypes(include=['number']).columns.tolist()
-            # Exclude specific columns
-            excluded_columns = {'latitude', 'longitude', 'geometry'}
-            valid_columns = [col for col in numerical_columns if col not in excluded_columns]
-            return ["All Numerical Columns"] + valid_columns
+            # Numerical columns, excluding latitude, longitude and geometry
+            return ["All Numerical Columns"] + data_operations.discretization_columns(self.parent.full_data)
         return []
 
     def apply_discretization(self, column, method, bins, labels, display_intervals=False):
         """
         Apply the specified discretization method to the given column(s).
+        Columns are binned concurrently and only the binned columns are replaced, the rest of the
+        DataFrame is shared with the current data rather than copied.
         """
-        updated_data = self.parent.full_data.copy()  # Copy the existing DataFrame for modifications
-
         if column == "All Numerical Columns":
-            # Apply discretization to all numerical columns (excluding latitude, longitude, geometry)
-            for col in self.get_column_options()[1:]:
-                try:
-                    if method == "equal_width":
-                        discretized = pd.cut(updated_data[col], bins=bins)
-                    elif method == "equal_frequency":
-                        discretized = pd.qcut(updated_data[col], q=bins)
-
-                    # Map to intervals or categorical labels
-                    if display_intervals:
-                        updated_data[col] = discretized
-                    else:
-                        updated_data[col] = discretized.apply(lambda x: labels[discretized.cat.categories.tolist().index(x)])
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"An error occurred while discretizing '{col}': {e}")
+            # All numerical columns (excluding latitude, longitude, geometry) of the data the task runs on
+            columns = None
         else:
-            # Apply discretization to a single column
-            try:
-                if method == "equal_width":
-                    discretized = pd.cut(updated_data[column], bins=bins)
-                elif method == "equal_frequency":
-                    discretized = pd.qcut(updated_data[column], q=bins)
-
-                # Map to intervals or categorical labels
-                if display_intervals:
-                    updated_data[column] = discretized
-                else:
-                    updated_data[column] = discretized.apply(lambda x: labels[discretized.cat.categories.tolist().index(x)])
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"An error occurred while discretizing '{column}': {e}")
-
-        # Update the parent table display with the modified data
-        self.parent.full_data = updated_data  # Replace the full_data with the updated one
-        self.parent.display_data()  # Refresh the displayed data to show the new table
+            columns = [column]
 
+        # Bin on the task runner (or record the step in lazy mode); the viewer swaps in the result and refreshes the table
+        self.parent.run_or_record(
+            lazy_plan.discretize_step(columns, method, bins, labels, display_intervals), "Discretizing", data_operations.discretize, columns, method, bins, labels, display_intervals,
+            on_done=lambda result: self.show_discretization_result(method, result[1]))
 
+    def show_discretization_result(self, method, errors):
+        for col, message in errors.items():
+            QMessageBox.critical(self.parent, "Error", f"An error occurred while discretizing '{col}': {message}")
+        method_name = "Equal width" if method == "equal_width" else "Equal frequency"
+        QMessageBox.information(self.parent, "Discretization Complete", f"{method_name} discretization applied.")
 
     def equal_width_discretization(self):
         if self.parent.full_data is not None:
@@ -103,7 +81,7 @@ class DataDiscretizationDialog(QDialog):
                 if ok:
                     try:
                         bins = 5  # Fixed number of bins
-                        labels = ["Very Low", "Low", "Medium", "High", "Very High"]
+                        labels = DISCRETIZATION_LABELS
                         self.apply_discretization(
                             column,
                             method="equal_width",
@@ -111,7 +89,6 @@ class DataDiscretizationDialog(QDialog):
                             labels=labels,
                             display_intervals=(display_intervals == "Intervals")
                         )
-                        QMessageBox.information(self, "Discretization Complete", "Equal width discretization applied.")
                     except Exception as e:
                         QMessageBox.critical(self, "Error", f"An error occurred during discretization: {e}")
         else:
@@ -140,7 +117,7 @@ class DataDiscretizationDialog(QDialog):
                 if ok:
                     try:
                         bins = 5  # Fixed number of bins
-                        labels = ["Very Low", "Low", "Medium", "High", "Very High"]
+                        labels = DISCRETIZATION_LABELS
                         self.apply_discretization(
                             column,
                             method="equal_frequency",
@@ -148,7 +125,6 @@ class DataDiscretizationDialog(QDialog):
                             labels=labels,
                             display_intervals=(display_intervals == "Intervals")
                         )
-                        QMessageBox.information(self, "Discretization Complete", "Equal frequency discretization applied.")
                     except Exception as e:
                         QMessageBox.critical(self, "Error", f"An error occurred during discretization: {e}")
         else:
@@ -0,0 +1,162 @@
+import gzip
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from csv_cache import PARQUET_AVAILABLE
+
+if PARQUET_AVAILABLE:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+
+# File extension -> export format
+EXPORT_FORMATS = {
+    '.csv': 'csv',
+    '.csv.gz': 'csv.gz',
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+}
+
+
+def export_format(file_path):
+    """Export format for a path, from its extension; plain CSV for unknown extensions."""
+    name = file_path.lower()
+    for extension in sorted(EXPORT_FORMATS, key=len, reverse=True):
+        if name.endswith(extension):
+            return EXPORT_FORMATS[extension]
+    return 'csv'
+
+
+def _chunks(data, chunk_rows):
+    for start in range(0, max(len(data), 1), chunk_rows):
+        yield start, data.iloc[start:start + chunk_rows]
+
+
+def _write_csv(data, handle, chunk_rows, progress):
+    for start, chunk in _chunks(data, chunk_rows):
+        chunk.to_csv(handle, index=False, header=start == 0)
+        if progress is not None and progress(min(start + chunk_rows, len(data)) / max(len(data), 1)) is False:
+            return False
+    return True
+
+
+def _write_csv_gz(data, handle, chunk_rows, progress, workers, level):
+    """
+    CSV chunks compressed in parallel as independent gzip members.
+    Concatenated members are one valid .gz file (gzip, zcat and pandas read them back as a
+    whole). zlib releases the GIL, so compression runs on all threads while the next chunks
+    are being formatted; at most 2 * workers chunks are held in memory.
+    """
+    pending = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start, chunk in _chunks(data, chunk_rows):
+            text = io.BytesIO()
+            chunk.to_csv(text, index=False, header=start == 0)
+            pending.append((start, executor.submit(gzip.compress, text.getvalue(), level)))
+            while len(pending) >= 2 * workers or (pending and pending[0][1].done()):
+                done_start, future = pending.pop(0)
+                handle.write(future.result())
+                if progress is not None and progress(min(done_start + chunk_rows, len(data)) / max(len(data), 1)) is False:
+                    for _, future in pending:
+                        future.cancel()
+                    return False
+        for done_start, future in pending:
+            handle.write(future.result())
+    if progress is not None:
+        progress(1.0)
+    return True
+
+
+def _write_arrow(data, handle, chunk_rows, progress, file_format):
+    """Parquet or Feather (Arrow IPC) written one record batch per chunk, zstd-compressed by Arrow's threads."""
+    writer = None
+    try:
+        for start, chunk in _chunks(data, chunk_rows):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                if file_format == 'parquet':
+                    writer = pq.ParquetWriter(handle, schema, compression='zstd')
+                else:
+                    options = pa.ipc.IpcWriteOptions(compression='zstd')
+                    writer = pa.ipc.new_file(handle, schema, options=options)
+            elif not table.schema.equals(schema):
+                # e.g. an object column that is entirely missing in this chunk
+                table = table.cast(schema)
+            writer.write_table(table)
+            if progress is not None and progress(min(start + chunk_rows, len(data)) / max(len(data), 1)) is False:
+                return False
+    finally:
+        if writer is not None:
+            writer.close()
+    return True
+
+
+def export_dataset(data, file_path, chunk_rows=500000, progress=None, workers=None, compression_level=6):
+    """
+    Write the dataset without the index as CSV, gzip-compressed CSV, Parquet or Feather (chosen
+    by extension), chunk by chunk so memory stays bounded by chunk_rows. The file is written
+    under a temporary name and renamed at the end, so a failed or cancelled export leaves no
+    partial file. progress, if given, is called with the fraction written and returns False to
+    cancel (the function then returns None); otherwise the path is returned.
+    """
+    file_format = export_format(file_path)
+    if file_format in ('parquet', 'feather') and not PARQUET_AVAILABLE:
+        raise ValueError(f"Exporting to {file_format} requires pyarrow.")
+    workers = workers or min(8, os.cpu_count() or 1)
+
+    temp_path = file_path + '.partial'
+    try:
+        with open(temp_path, 'wb') as output:
+            if file_format == 'csv':
+                completed = _write_csv(data, output, chunk_rows, progress)
+            elif file_format == 'csv.gz':
+                completed = _write_csv_gz(data, output, chunk_rows, progress, workers, compression_level)
+            else:
+                completed = _write_arrow(data, output, chunk_rows, progress, file_format)
+        if not completed:
+            os.remove(temp_path)
+            return None
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return file_path
+
+
+def selection_to_tsv(data, blocks):
+    """Tab-separated text of each (row start, row stop, column positions) block of data, one block after another."""
+    return "".join(data.iloc[start:stop, columns].to_csv(sep='\t', header=False, index=False, lineterminator='\n')
+                   for start, stop, columns in blocks)
+
+
+def write_selection_tsv(data, blocks, file_path, chunk_rows=500000, progress=None):
+    """
+    Same text as selection_to_tsv streamed to a file chunk by chunk, for selections too large
+    for the clipboard. progress works as in export_dataset; a cancelled or failed file is removed.
+    """
+    total = sum(stop - start for start, stop, _ in blocks) or 1
+    written = 0
+    completed = True
+    try:
+        with open(file_path, 'wb') as handle:
+            for start, stop, columns in blocks:
+                for chunk_start in range(start, stop, chunk_rows):
+                    chunk_stop = min(chunk_start + chunk_rows, stop)
+                    data.iloc[chunk_start:chunk_stop, columns].to_csv(handle, sep='\t', header=False, index=False,
+                                                                        lineterminator='\n')
+                    written += chunk_stop - chunk_start
+                    if progress is not None and progress(written / total) is False:
+                        completed = False
+                        break
+                if not completed:
+                    break
+        if not completed:
+            os.remove(file_path)
+            return None
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return file_path
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant
+
+
+def column_array(series):
+    """The values of a column, indexable by position, without converting them."""
+    return series.to_numpy() if isinstance(series.dtype, np.dtype) else series.array
+
+
+class DataFrameModel(QAbstractTableModel):
+    """
+    Read-only table model over a pandas DataFrame.
+    Cells are formatted on demand straight from the column arrays, so only the rows the view
+    actually paints cost anything, whatever the size of the page or of the dataset.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._columns = []
+        self._arrays = []
+        self._index = pd.RangeIndex(0)
+        self._start = 0
+        self._end = 0
+
+    def set_data(self, data, start=0, end=None):
+        """Point the model at a DataFrame and at the window of rows [start, end) to expose."""
+        self.beginResetModel()
+        if data is None:
+            self._columns = []
+            self._arrays = []
+            self._index = pd.RangeIndex(0)
+            self._start = self._end = 0
+        else:
+            # One array per column, without copies: numpy columns as views, categorical, string and
+            # other extension columns as their own arrays (never converted to object arrays), and
+            # the index as it is (a RangeIndex stays a range); cells and labels are read on demand
+            self._columns = [str(col) for col in data.columns]
+            self._arrays = [column_array(data.iloc[:, j]) for j in range(data.shape[1])]
+            self._index = data.index
+            self._start = max(0, min(start, len(data)))
+            self._end = len(data) if end is None else max(self._start, min(end, len(data)))
+        self.endResetModel()
+
+    def row_offset(self):
+        """Position in the full dataset of the first row exposed by the model."""
+        return self._start
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._end - self._start
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return QVariant()
+        return str(self._arrays[index.column()][self._start + index.row()])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return self._columns[section] if section < len(self._columns) else QVariant()
+        # Continuous row index based on the DataFrame index, as the original table did
+        label = self._index[self._start + section]
+        try:
+            return str(label + 1)
+        except TypeError:
+            return str(label)
@@ -1,6 +1,20 @@
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QLabel, QScrollArea, QWidget, QTableWidget, QTableWidgetItem, QFileDialog, QMessageBox, QInputDialog, QApplication
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QLabel, QScrollArea, QWidget, QTableWidget, QTableWidgetItem, QFileDialog, QMessageBox, QInputDialog, QApplication, QProgressDialog, QCheckBox
 from PyQt5.QtGui import QClipboard
+from PyQt5.QtCore import Qt, QThread
 import pandas as pd
+from csv_import_worker import CsvImportWorker
+from csv_cache import default_cache
+import data_operations
+from data_export import EXPORT_FORMATS
+
+# Save dialog filter -> extension added when the file name has none
+SAVE_FILTERS = {
+    "CSV Files (*.csv)": ".csv",
+    "Compressed CSV (*.csv.gz)": ".csv.gz",
+    "Parquet Files (*.parquet)": ".parquet",
+    "Feather Files (*.feather)": ".feather",
+    "All Files (*)": None,
+}
 
 class DataManipulationDialog(QDialog):
     def __init__(self, parent=None):
@@ -14,6 +28,18 @@ class DataManipulationDialog(QDialog):
         self.import_button.clicked.connect(self.import_data)
         layout.addWidget(self.import_button)
 
+        # Compact load: downcast numeric columns and categorize repeated strings on import
+        self.compact_checkbox = QCheckBox("Compact load (reduce memory usage)")
+        self.compact_checkbox.setChecked(self.parent.compact_load)
+        self.compact_checkbox.toggled.connect(self.set_compact_load)
+        layout.addWidget(self.compact_checkbox)
+
+        # Approximate statistics: quantiles and unique counts from sketches built while importing
+        self.approximate_checkbox = QCheckBox("Approximate statistics (very large datasets)")
+        self.approximate_checkbox.setChecked(self.parent.approximate_stats)
+        self.approximate_checkbox.toggled.connect(self.set_approximate_stats)
+        layout.addWidget(self.approximate_checkbox)
+
         self.description_button = QPushButton("Dataset Description")
         self.description_button.clicked.connect(self.show_description)
         layout.addWidget(self.description_button)
@@ -30,18 +56,126 @@ class DataManipulationDialog(QDialog):
         self.save_button.clicked.connect(self.save_data)
         layout.addWidget(self.save_button)
 
+        self.clear_cache_button = QPushButton("Clear Import Cache")
+        self.clear_cache_button.clicked.connect(self.clear_import_cache)
+        layout.addWidget(self.clear_cache_button)
+
         self.setLayout(layout)
 
     def import_data(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Open CSV File", "", "CSV Files (*.csv);;All Files (*)")
         if file_path:
             self.parent.file_path = file_path
-            self.parent.full_data = pd.read_csv(file_path)
-            self.parent.current_page = 0
+            self.previous_data = self.parent.full_data
+            self.import_report = None
+            self.import_sketch = None
+
+            # Progress dialog with a cancel button, scaled to per-mille of the file size
+            self.progress_dialog = QProgressDialog("Importing dataset...", "Cancel", 0, 1000, self)
+            self.progress_dialog.setWindowTitle("Importing")
+            self.progress_dialog.setWindowModality(Qt.WindowModal)
+            self.progress_dialog.setMinimumDuration(0)
+            self.progress_dialog.setValue(0)
+
+            # Parse the file on a worker thread so the window stays responsive
+            self.import_thread = QThread(self.parent)
+            self.import_worker = CsvImportWorker(file_path, compact=self.parent.compact_load,
+                                                 sketch=self.parent.approximate_stats)
+            self.import_worker.moveToThread(self.import_thread)
+            self.import_thread.started.connect(self.import_worker.run)
+            self.import_worker.first_chunk.connect(self.on_import_first_chunk)
+            self.import_worker.progress.connect(self.on_import_progress)
+            self.import_worker.status.connect(self.progress_dialog.setLabelText)
+            self.import_worker.compacted.connect(self.on_import_compacted)
+            self.import_worker.sketched.connect(self.on_import_sketched)
+            self.import_worker.finished.connect(self.on_import_finished)
+            self.import_worker.failed.connect(self.on_import_failed)
+            self.import_worker.cancelled.connect(self.on_import_cancelled)
+            # Called directly (not queued) so it reaches the worker while it is busy reading
+            self.progress_dialog.canceled.connect(lambda: self.import_worker.cancel())
+            self.import_thread.start()
+
+    def on_import_first_chunk(self, chunk):
+        """Shows the first page as soon as the first chunk has been parsed."""
+        self.parent.replace_data(chunk, record_history=False)
+        self.parent.current_page = 0
+        self.parent.update_total_pages()
+        self.parent.display_data()
+
+    def on_import_progress(self, rows_read, bytes_read, total_bytes):
+        if total_bytes > 0:
+            self.progress_dialog.setValue(min(999, int(bytes_read * 1000 / total_bytes)))
+        self.progress_dialog.setLabelText(f"Importing dataset... {rows_read:,} rows ({bytes_read / 1e6:,.1f} / {total_bytes / 1e6:,.1f} MB)")
+
+    def set_compact_load(self, checked):
+        self.parent.compact_load = checked
+
+    def set_approximate_stats(self, checked):
+        self.parent.approximate_stats = checked
+
+    def on_import_compacted(self, report):
+        self.import_report = report
+
+    def on_import_sketched(self, sketch):
+        self.import_sketch = sketch
+
+    def on_import_finished(self, data):
+        self.finish_import()
+        # A new dataset starts a new undo history and drops operations recorded for the old one
+        self.parent.history.clear()
+        self.parent.discard_plan()
+        self.parent.full_data = data
+        if self.import_sketch is not None:
+            self.parent.sketches.seed(self.import_sketch, self.parent.data_version)
+        self.parent.current_page = 0
+        self.parent.update_total_pages()
+        self.parent.display_data()
+        message = f"Dataset imported successfully ({len(data)} rows)."
+        if self.import_report:
+            message += f"\n\nCompact load:\n{self.import_report}"
+        QMessageBox.information(self, "Import Successful", message)
+
+    def on_import_failed(self, message):
+        self.finish_import()
+        self.restore_previous_data()
+        QMessageBox.warning(self, "Import Error", f"An error occurred while importing the file: {message}")
+
+    def on_import_cancelled(self):
+        self.finish_import()
+        self.restore_previous_data()
+        QMessageBox.information(self, "Import Cancelled", "Dataset import was cancelled.")
+
+    def finish_import(self):
+        """Closes the progress dialog and shuts down the worker thread."""
+        self.progress_dialog.reset()
+        self.import_thread.quit()
+        self.import_thread.wait()
+        self.import_worker.deleteLater()
+        self.import_thread.deleteLater()
+
+    def restore_previous_data(self):
+        """Puts back the dataset that was loaded before a failed or cancelled import."""
+        self.parent.replace_data(self.previous_data, record_history=False)
+        self.parent.current_page = 0
+        if self.parent.full_data is not None:
             self.parent.update_total_pages()
             self.parent.display_data()
-            QMessageBox.information(self, "Import Successful", "Dataset imported successfully.")
-    
+        else:
+            self.parent.table_model.set_data(None)
+            self.parent.page_label.setText("Page: 0/0")
+
+    def clear_import_cache(self):
+        """Deletes the Parquet copies kept for previously imported CSV files."""
+        if not default_cache.enabled:
+            QMessageBox.information(self, "Cache Disabled", "The import cache requires pyarrow to be installed.")
+            return
+        size_mb = default_cache.total_bytes() / 1e6
+        reply = QMessageBox.question(self, "Clear Import Cache",
+                                     f"Delete {size_mb:,.1f} MB of cached datasets from {default_cache.cache_dir}?")
+        if reply == QMessageBox.Yes:
+            default_cache.clear()
+            QMessageBox.information(self, "Cache Cleared", "The import cache has been cleared.")
+
     def update_instance(self):
         
             if self.parent.full_data is not None:
@@ -54,13 +188,39 @@ class DataManipulationDialog(QDialog):
                         # Get the new value for the cell
                         new_value, ok = QInputDialog.getText(self, "New Value", f"Enter new value for {column} at row {row}:")
                         if ok:
-                            # Update the dataset with the new value
-                            self.parent.full_data.at[row, column] = new_value
+                            # Replace the edited column instead of writing into it, so earlier
+                            # versions kept for undo are left untouched
+                            data = self.parent.full_data
+                            previous_version = self.parent.data_version
+                            values = self.column_with_value(data[column], row, new_value)
+                            updated = data.copy(deep=False)
+                            updated[column] = values
+                            self.parent.full_data = updated
+                            self.parent.column_stats.cell_updated(previous_version, self.parent.data_version,
+                                                                  column, data[column].at[row], values, row)
                             self.parent.display_data()
                             QMessageBox.information(self, "Update Successful", f"Row {row} updated successfully.")
             else:
                 QMessageBox.warning(self, "No Data", "Please import a dataset first.")    
 
+    def column_with_value(self, values, row, text):
+        """Copy of a column with one cell set; numeric columns keep a numeric dtype when the text is a number."""
+        values = values.copy()
+        value = text
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            try:
+                value = float(text)
+                if pd.api.types.is_integer_dtype(values) and value.is_integer():
+                    value = int(value)
+                else:
+                    values = values.astype('float64')
+            except ValueError:
+                values = values.astype(object)
+        elif not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+            values = values.astype(object)
+        values.at[row] = value
+        return values
+
     def delete_instance(self):
         """Deletes a specific row from the dataset."""
         if self.parent.full_data is not None:
@@ -68,24 +228,28 @@ class DataManipulationDialog(QDialog):
             row, ok = QInputDialog.getInt(self, "Delete Row", "Enter row number to delete:", 0, 0, len(self.parent.full_data) - 1)
             if ok:
                 # Drop the selected row and reset the index
-                self.parent.full_data.drop(index=row, inplace=True)
-                self.parent.full_data.reset_index(drop=True, inplace=True)
+                data = self.parent.full_data
+                previous_version = self.parent.data_version
+                self.parent.full_data = data.drop(index=row).reset_index(drop=True)
+                self.parent.column_stats.row_deleted(previous_version, self.parent.data_version, data, row)
                 self.parent.display_data()
                 QMessageBox.information(self, "Delete Successful", f"Row {row} deleted successfully.")
         else:
             QMessageBox.warning(self, "No Data", "Please import a dataset first.")
     def save_data(self):
-        """Saves the current dataset to a CSV file."""
+        """Saves the current dataset as CSV, compressed CSV, Parquet or Feather in the background."""
         if self.parent.full_data is not None:
-            # Prompt the user to select a location and name for the CSV file
-            save_path, _ = QFileDialog.getSaveFileName(self, "Save CSV File", "", "CSV Files (*.csv);;All Files (*)")
+            # Prompt the user to select a location, name and format for the file
+            save_path, selected_filter = QFileDialog.getSaveFileName(self, "Save Dataset", "", ";;".join(SAVE_FILTERS))
             if save_path:
-                try:
-                    # Save the DataFrame to the specified path
-                    self.parent.full_data.to_csv(save_path, index=False)
-                    QMessageBox.information(self, "Save Successful", "Dataset saved successfully.")
-                except Exception as e:
-                    QMessageBox.warning(self, "Save Error", f"An error occurred while saving the file: {e}")
+                # Add the extension of the chosen format if the name has none of the known ones
+                extension = SAVE_FILTERS.get(selected_filter)
+                if extension and not any(save_path.lower().endswith(known) for known in EXPORT_FORMATS):
+                    save_path += extension
+                # Written in chunks on the task runner, with progress and cancel in the status bar
+                self.parent.run_background_task(
+                    "Saving dataset", data_operations.save_dataset, save_path,
+                    on_done=lambda path: QMessageBox.information(self.parent, "Save Successful", f"Dataset saved to {path}."))
         else:
             QMessageBox.warning(self, "No Data", "Please import a dataset first.")
 
@@ -93,27 +257,14 @@ class DataManipulationDialog(QDialog):
         if self.parent.full_data is not None:
             data = self.parent.full_data
             
-            # Overview Table
-            overview = pd.DataFrame({
-                "Column Name": data.columns,
-                "Data Type": data.dtypes,
-                "Missing Values": data.isnull().sum(),
-                "Unique Values": data.nunique()
-            })
-            overview['Column Name'] = overview['Column Name'].astype(str)
-            overview['Data Type'] = overview['Data Type'].astype(str)
+            # Overview and statistics, cached per column until the dataset changes
             overview_summary = f"Dataset contains {data.shape[0]} rows and {data.shape[1]} columns."
-
-            # Statistical Summary
-            numeric_data = data.select_dtypes(include=['number'])
-            stats = pd.DataFrame({
-                "Mean": numeric_data.mean(),
-                "Median": numeric_data.median(),
-                "Mode": numeric_data.mode().iloc[0],
-                "Std Dev": numeric_data.std(),
-                "Min": numeric_data.min(),
-                "Max": numeric_data.max()
-            })
+            if self.parent.approximate_stats:
+                sketch = self.parent.sketches.get(data, self.parent.data_version)
+                overview, stats = sketch.describe(data)
+                overview_summary += "\n" + sketch.error_note()
+            else:
+                overview, stats = self.parent.column_stats.describe(data, self.parent.data_version)
 
             # Creating the Scrollable Window with Tables
             self.description_window = QDialog(self)
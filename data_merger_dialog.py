@@ -1,9 +1,7 @@
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QMessageBox, QFileDialog
-import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point, Polygon
-from shapely import wkt
-import ast
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QMessageBox, QFileDialog, QInputDialog
+import data_operations
+from csv_cache import read_csv_cached
+from coordinate_join import MAX_PRECISION
 
 class DataMergerDialog(QDialog):
     def __init__(self, parent=None):
@@ -35,32 +33,51 @@ class DataMergerDialog(QDialog):
             if not file_path:
                 return
 
-            # Load the second CSV file
-            try:
-                secondary_data = pd.read_csv(file_path)
-            except Exception as e:
-                QMessageBox.warning(self, "File Error", f"Could not load CSV file: {e}")
+            # Exact matching on rounded coordinates, or nearest point for grids of different resolutions
+            modes = ["Exact match (in-memory)", "Exact match (streaming, bounded memory)", "Nearest point (different grids)"]
+            mode, ok = QInputDialog.getItem(self, "Merge Mode", "Choose how to match the coordinates:", modes, 0, False)
+            if not ok:
                 return
-
-            # Check if both files have 'latitude' and 'longitude' columns
-            required_columns = {'latitude', 'longitude'}
-            if not required_columns.issubset(self.parent.full_data.columns) or not required_columns.issubset(secondary_data.columns):
-                QMessageBox.warning(self, "Missing Columns", "Both files must have 'latitude' and 'longitude' columns for merging.")
+            on_done = lambda data: QMessageBox.information(self.parent, "Merge Complete", "Data has been successfully merged and displayed.")
+
+            if mode == modes[2]:
+                max_distance, ok = QInputDialog.getDouble(self, "Maximum Distance", "Maximum distance to the nearest point in km (0 = no limit):",
+                                                          0.0, 0.0, 20000.0, 3)
+                if not ok:
+                    return
+                self.parent.run_data_task("Merging datasets (nearest point)", self.merge_nearest_with_file, file_path,
+                                          max_distance or None, on_done=on_done)
                 return
 
-            # Perform the merge on 'latitude' and 'longitude' columns
-            merged_data = pd.merge(self.parent.full_data, secondary_data, on=['latitude', 'longitude'], how='inner')
-
-            # Update the main data with merged data
-            self.parent.full_data = merged_data
-            self.parent.current_page = 0
-            self.parent.update_total_pages()
-            self.parent.display_data()
+            # Coordinates are matched after rounding to this many decimals
+            precision, ok = QInputDialog.getInt(self, "Coordinate Precision", "Decimals kept when matching latitude/longitude:",
+                                                data_operations.DEFAULT_COORDINATE_PRECISION, 0, MAX_PRECISION)
+            if not ok:
+                return
 
-            QMessageBox.information(self, "Merge Complete", "Data has been successfully merged and displayed.")
+            # Load the second CSV file and merge on 'latitude' and 'longitude' on the task runner
+            self.parent.run_data_task(
+                "Merging datasets", self.merge_with_file, file_path, precision, mode == modes[1], on_done=on_done)
         else:
             QMessageBox.warning(self, "No Data", "Please import a primary dataset first.")
 
+    def merge_with_file(self, data, file_path, precision, streaming=False, progress=None):
+        """Runs on the task runner: joins the secondary CSV on the rounded coordinates."""
+        if streaming:
+            return data_operations.merge_on_coordinates_streaming(data, file_path, precision, progress=progress)
+        try:
+            secondary_data = read_csv_cached(file_path)
+        except Exception as e:
+            raise RuntimeError(f"Could not load CSV file: {e}")
+        return data_operations.merge_on_coordinates(data, secondary_data, precision)
+
+    def merge_nearest_with_file(self, data, file_path, max_distance_km):
+        """Runs on the task runner: joins each row to the nearest point of the secondary CSV."""
+        try:
+            return data_operations.merge_nearest(data, file_path, max_distance_km)
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"Could not merge with {file_path}: {e}")
+
     def reduce_by_soil_polygons(self):
         # Prompt user to select soil and climate data files
         soil_data_path, _ = QFileDialog.getOpenFileName(self, "Select Soil Data File", "", "CSV Files (*.csv);;All Files (*)")
@@ -73,68 +90,31 @@ class DataMergerDialog(QDialog):
             QMessageBox.warning(self, "File Selection Error", "Please select a valid climate data file.")
             return
 
-        # Perform the reduction
-        try:
-            reduced_data = self.perform_reduction(soil_data_path, climate_data_path)
-
-            # Update the parent application's full_data and refresh the display
-            self.parent.full_data = reduced_data
-            self.parent.current_page = 0
-            self.parent.update_total_pages()
-            self.parent.display_data()
+        # Streaming keeps memory bounded for climate files that do not fit in RAM
+        modes = ["In-memory", "Streaming (bounded memory)"]
+        mode, ok = QInputDialog.getItem(self, "Reduction Mode", "Choose how to read the climate data:", modes, 0, False)
+        if not ok:
+            return
 
-            QMessageBox.information(self, "Reduction Complete", "Climate data has been reduced by soil polygons.")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
+        # Perform the reduction on the task runner (streaming reports progress and can be cancelled)
+        reduction = self.perform_streaming_reduction if mode == modes[1] else self.perform_reduction
+        self.parent.run_task(
+            "Reducing climate data by soil polygons", reduction, soil_data_path, climate_data_path,
+            on_done=lambda data: QMessageBox.information(self.parent, "Reduction Complete", "Climate data has been reduced by soil polygons."))
 
     def perform_reduction(self, soil_data_path, climate_data_path):
         try:
-            # Load soil data from CSV
-            soil_data = pd.read_csv(soil_data_path)
-            if 'geometry' not in soil_data.columns:
-                raise ValueError("Soil data must have a 'geometry' column.")
-
-            # Convert 'geometry' column to Polygon objects
-            if soil_data['geometry'].iloc[0].startswith("POLYGON"):
-                # If geometry is in WKT format
-                soil_data['geometry'] = soil_data['geometry'].apply(wkt.loads)
-            else:
-                # If geometry is a stringified list of tuples
-                soil_data['geometry'] = soil_data['geometry'].apply(ast.literal_eval).apply(Polygon)
-
-            # Convert soil data to GeoDataFrame
-            soil_gdf = gpd.GeoDataFrame(soil_data, geometry='geometry')
-            soil_gdf = soil_gdf.set_crs("EPSG:4326")  # Assuming WGS84 (adjust if needed)
-
-            # Load climate data as DataFrame
-            climate_data = pd.read_csv(climate_data_path)
-
-            # Validate climate data has 'longitude' and 'latitude' columns
-            if 'longitude' not in climate_data.columns or 'latitude' not in climate_data.columns:
-                raise ValueError("Climate data must contain 'longitude' and 'latitude' columns.")
-
-            # Convert climate data to GeoDataFrame with Point geometry
-            climate_data['geometry'] = climate_data.apply(
-                lambda row: Point(row['longitude'], row['latitude']), axis=1
-            )
-            climate_gdf = gpd.GeoDataFrame(climate_data, geometry='geometry')
-            climate_gdf = climate_gdf.set_crs("EPSG:4326")  # Assuming WGS84 (adjust if needed)
-
-            # Spatial join: Map climate data points to soil polygons
-            climate_with_soil = gpd.sjoin(climate_gdf, soil_gdf, how='inner', predicate='within')
-
-            # Group climate data by soil polygon and calculate the mean for each group
-            climate_columns = [col for col in climate_data.columns if col not in ['latitude', 'longitude', 'geometry']]
-            aggregated_climate = climate_with_soil.groupby('index_right')[climate_columns].mean().reset_index()
-
-            # Retain unique soil data and merge with aggregated climate data
-            soil_gdf['polygon_id'] = soil_gdf.index  # Add a unique polygon ID
-            reduced_data = pd.merge(soil_gdf, aggregated_climate, left_on='polygon_id', right_on='index_right', how='left')
-
-            # Drop unnecessary columns and return reduced dataset
-            reduced_data = reduced_data.drop(columns=['polygon_id', 'index_right'])
-            return reduced_data
-
+            return data_operations.reduce_by_soil_polygons(read_csv_cached(climate_data_path), soil_data_path)
         except Exception as e:
             raise RuntimeError(f"An error occurred while processing: {str(e)}")
 
+    def perform_streaming_reduction(self, soil_data_path, climate_data_path, chunk_size=500000, progress=None):
+        """
+        Same per-polygon means as perform_reduction with memory bounded by the chunk size.
+        progress, if given, is called with the fraction of the file read and returns False to cancel.
+        """
+        try:
+            return data_operations.reduce_by_soil_polygons_streaming(climate_data_path, soil_data_path,
+                                                                     chunk_size=chunk_size, progress=progress)
+        except Exception as e:
+            raise RuntimeError(f"An error occurred while processing: {str(e)}")
@@ -1,12 +1,13 @@
 import pandas as pd
-from scipy.stats import zscore
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QMessageBox
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QMessageBox, QCheckBox, QFileDialog
+import data_operations
+import lazy_plan
+from normalizer import Normalizer
 
 class DataNormalizationDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
-        self.data = None  # Local storage for the dataset
         self.setWindowTitle("Data Normalization")
         self.setGeometry(200, 200, 400, 200)
 
@@ -23,49 +24,83 @@ class DataNormalizationDialog(QDialog):
         self.zscore_button.clicked.connect(self.apply_zscore_normalization)
         layout.addWidget(self.zscore_button)
 
+        # Store the normalized columns as float32 to halve their memory
+        self.float32_checkbox = QCheckBox("Store as float32")
+        layout.addWidget(self.float32_checkbox)
+
+        # Fitted parameters can be saved and reused on new files without refitting
+        self.save_parameters_button = QPushButton("Save Fitted Parameters...")
+        self.save_parameters_button.clicked.connect(self.save_parameters)
+        self.save_parameters_button.setEnabled(self.parent.normalizer is not None)
+        layout.addWidget(self.save_parameters_button)
+
+        self.normalize_file_button = QPushButton("Normalize File with Saved Parameters...")
+        self.normalize_file_button.clicked.connect(self.normalize_file)
+        layout.addWidget(self.normalize_file_button)
+
         # Set dialog layout
         self.setLayout(layout)
 
-    def set_data(self, data):
-        """Set the dataset for the dialog."""
-        self.data = data
+    def dtype(self):
+        return 'float32' if self.float32_checkbox.isChecked() else 'float64'
 
-    def apply_min_max_normalization(self):
-        if self.data is not None:
-            columns_to_normalize = self.data.columns.difference(['time', 'latitude', 'longitude', 'geometry'])
-            non_normalized_columns = []
-            for column in columns_to_normalize:
-                min_value = self.data[column].min()
-                max_value = self.data[column].max()
-                if max_value - min_value > 1e-6:  # Ensure there's a significant range for normalization
-                    self.data[column] = (self.data[column] - min_value) / (max_value - min_value)
-                else:
-                    non_normalized_columns.append(column)
+    def on_normalized(self, result, method_name, reason):
+        # Keep the fitted normalizer for saving and for normalizing other files
+        self.parent.normalizer = result[2]
+        self.save_parameters_button.setEnabled(True)
+        self.show_normalization_result(method_name, result[1], reason)
+
+    def show_normalization_result(self, method_name, non_normalized_columns, reason):
+        if non_normalized_columns:
+            QMessageBox.warning(self.parent, "Partial Normalization",
+                                f"Data has been normalized using {method_name}.\n"
+                                f"The following columns were not normalized due to {reason}: {', '.join(non_normalized_columns)}")
+        else:
+            QMessageBox.information(self.parent, "Normalization Complete", f"Data has been normalized using {method_name}.")
 
-            if non_normalized_columns:
-                QMessageBox.warning(self, "Partial Normalization",
-                                    f"Data has been normalized using Min-Max.\n"
-                                    f"The following columns were not normalized due to insufficient range: {', '.join(non_normalized_columns)}")
-            else:
-                QMessageBox.information(self, "Normalization Complete", "Data has been normalized using Min-Max.")
+    def apply_min_max_normalization(self):
+        if self.parent.full_data is not None:
+            self.parent.run_or_record(
+                lazy_plan.normalize_step('min_max', self.dtype()), "Min-Max normalization", data_operations.normalize,
+                'min_max', self.dtype(), on_done=lambda result: self.on_normalized(result, "Min-Max", "insufficient range"))
         else:
             QMessageBox.warning(self, "No Data", "No dataset available for normalization.")
 
     def apply_zscore_normalization(self):
-        if self.data is not None:
-            columns_to_normalize = self.data.columns.difference(['time', 'latitude', 'longitude', 'geometry'])
-            non_normalized_columns = []
-            for column in columns_to_normalize:
-                if self.data[column].std() > 1e-6:  # Check if std deviation is above threshold
-                    self.data[column] = (self.data[column] - self.data[column].mean()) / self.data[column].std()
-                else:
-                    non_normalized_columns.append(column)
-
-            if non_normalized_columns:
-                QMessageBox.warning(self, "Partial Normalization",
-                                    f"Data has been normalized using Z-score.\n"
-                                    f"The following columns were not normalized due to low variance: {', '.join(non_normalized_columns)}")
-            else:
-                QMessageBox.information(self, "Normalization Complete", "Data has been normalized using Z-score.")
+        if self.parent.full_data is not None:
+            self.parent.run_or_record(
+                lazy_plan.normalize_step('zscore', self.dtype()), "Z-score normalization", data_operations.normalize,
+                'zscore', self.dtype(), on_done=lambda result: self.on_normalized(result, "Z-score", "low variance"))
         else:
             QMessageBox.warning(self, "No Data", "No dataset available for normalization.")
+
+    def save_parameters(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save Normalization Parameters", "", "JSON Files (*.json);;All Files (*)")
+        if not path:
+            return
+        try:
+            self.parent.normalizer.save(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Save Error", f"Could not save the parameters: {e}")
+
+    def normalize_file(self):
+        """Streams a CSV file through saved parameters chunk by chunk, in the background."""
+        parameters_path, _ = QFileDialog.getOpenFileName(self, "Open Normalization Parameters", "", "JSON Files (*.json);;All Files (*)")
+        if not parameters_path:
+            return
+        try:
+            normalizer = Normalizer.load(parameters_path)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.warning(self, "Invalid Parameters", f"Could not read the parameters: {e}")
+            return
+        input_path, _ = QFileDialog.getOpenFileName(self, "Select CSV File to Normalize", "", "CSV Files (*.csv);;All Files (*)")
+        if not input_path:
+            return
+        output_path, _ = QFileDialog.getSaveFileName(self, "Save Normalized File", "", "CSV Files (*.csv);;All Files (*)")
+        if not output_path:
+            return
+        self.parent.task_runner.submit(
+            "Normalizing file", normalizer.transform_csv, input_path, output_path,
+            on_success=lambda result: QMessageBox.information(self.parent, "Normalization Complete",
+                                                              f"{result[1]:,} rows written to {result[0]}."),
+            on_error=lambda message: QMessageBox.warning(self.parent, "Normalization Failed", message))
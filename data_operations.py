@@ -0,0 +1,392 @@
+"""
+GUI-independent implementations of the dataset operations offered by the dialogs.
+Every function takes and returns plain pandas objects, so the same code backs the Qt dialogs
+and the headless pipeline runner (pipeline_runner.py).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import outlier_stats
+from csv_cache import default_cache
+from memory_optimizer import compact_dtypes
+from spatial_index import load_soil_index, load_point_index
+from coordinate_join import join_on_coordinates, join_nearest
+from data_export import export_dataset
+from normalizer import Normalizer, NON_FEATURE_COLUMNS, feature_columns
+from resampling import period_codes, value_columns
+from parallel_groupby import parallel_aggregate_groups
+from wide_pivot import estimate_pivot, pivot_by_cell
+
+COORDINATE_COLUMNS = ['latitude', 'longitude']
+
+
+# Import
+
+def load_dataset(file_path, compact=False, cache=default_cache):
+    """Read a CSV file (through the Parquet cache when available), optionally with compact dtypes."""
+    data = cache.load(file_path) if cache is not None else None
+    if data is None:
+        data = pd.read_csv(file_path)
+        if cache is not None:
+            cache.store(file_path, data)
+    if compact:
+        data, _ = compact_dtypes(data)
+    return data
+
+
+# Cleaning
+
+OUTLIER_METHODS = ('remove', 'mean', 'median', 'cap')
+
+
+def clean_outliers(data, method, stats=None):
+    """
+    Handle IQR outliers of every numeric column: 'remove' rows, replace with 'mean' or 'median',
+    or 'cap' to the 5th/95th percentiles. stats may be passed in from an OutlierStatistics cache.
+    """
+    if stats is None:
+        stats = outlier_stats.compute_outlier_statistics(data)
+    if method == 'remove':
+        return outlier_stats.remove_outliers(data, stats)
+    if method in ('mean', 'median'):
+        return outlier_stats.replace_outliers(data, stats, method)
+    if method == 'cap':
+        return outlier_stats.cap_outliers(data, stats)
+    raise ValueError(f"Unknown outlier method: {method}")
+
+
+def remove_nan_rows(data):
+    """Rows without any missing value."""
+    return data.dropna()
+
+
+# Normalization
+
+def normalization_columns(data):
+    return feature_columns(data)
+
+
+def normalize(data, method, dtype='float64', inplace=False):
+    """
+    Fit a Normalizer on the numeric feature columns and scale them (in data itself with inplace=True).
+    Returns (data, skipped columns, normalizer).
+    """
+    normalizer = Normalizer(method, dtype).fit(data)
+    return normalizer.transform(data, inplace), normalizer.skipped, normalizer
+
+
+def normalize_min_max(data):
+    """Min-Max scale numeric feature columns. Returns (data, columns skipped for insufficient range)."""
+    data, skipped, _ = normalize(data, 'min_max')
+    return data, skipped
+
+
+def normalize_zscore(data):
+    """Z-score scale numeric feature columns. Returns (data, columns skipped for low variance)."""
+    data, skipped, _ = normalize(data, 'zscore')
+    return data, skipped
+
+
+# Aggregation
+
+# Season calendars: the (month, day) on which each season starts, in calendar order.
+# A date belongs to the season whose start is the latest one on or before it (wrapping around the new year).
+SEASON_CALENDARS = {
+    "Astronomical (Northern Hemisphere)": [((3, 21), 'Spring'), ((6, 21), 'Summer'), ((9, 23), 'Fall'), ((12, 21), 'Winter')],
+    "Meteorological (Northern Hemisphere)": [((3, 1), 'Spring'), ((6, 1), 'Summer'), ((9, 1), 'Fall'), ((12, 1), 'Winter')],
+    "Astronomical (Southern Hemisphere)": [((3, 21), 'Fall'), ((6, 21), 'Winter'), ((9, 23), 'Spring'), ((12, 21), 'Summer')],
+    "Meteorological (Southern Hemisphere)": [((3, 1), 'Fall'), ((6, 1), 'Winter'), ((9, 1), 'Spring'), ((12, 1), 'Summer')],
+}
+DEFAULT_SEASON_CALENDAR = "Astronomical (Northern Hemisphere)"
+
+
+def assign_seasons(times, calendar=DEFAULT_SEASON_CALENDAR):
+    """
+    Label a datetime Series with seasons using vectorized month/day arithmetic.
+    Returns a categorical Series; NaT values get a missing label.
+    """
+    boundaries = SEASON_CALENDARS[calendar]
+    starts = np.array([month * 100 + day for (month, day), _ in boundaries])
+    labels = [season for _, season in boundaries]
+
+    month_day = (times.dt.month * 100 + times.dt.day).to_numpy(dtype=float, na_value=np.nan)
+    # Index of the last season start on or before each date; -1 (before the first start) wraps to the last season
+    positions = np.searchsorted(starts, month_day, side='right') - 1
+    codes = np.where(positions < 0, len(labels) - 1, positions)
+    codes[np.isnan(month_day)] = -1
+
+    # Categories sorted by name so grouping orders seasons exactly like grouping on plain strings
+    categories = sorted(labels)
+    remap = np.array([categories.index(label) for label in labels] + [-1])
+    return pd.Series(pd.Categorical.from_codes(remap[codes], categories=categories), index=times.index, name='season')
+
+
+def require_columns(data, columns, message):
+    if not set(columns).issubset(data.columns):
+        raise ValueError(message)
+
+
+def ensure_datetime(data):
+    """
+    Return (data with a datetime 'time' column, number of rows dropped because their time could not be parsed).
+    """
+    if 'time' not in data.columns:
+        raise ValueError("The data must have a 'time' column in datetime format.")
+    updated = data.copy(deep=False)
+    updated['time'] = pd.to_datetime(data['time'], errors='coerce')
+    invalid = int(updated['time'].isnull().sum())
+    if invalid:
+        updated = updated.dropna(subset=['time'])
+    return updated, invalid
+
+
+# The aggregations below run in `workers` processes over spatial tiles when workers > 1
+# (None: one per core); see parallel_groupby.py.
+
+def aggregate_monthly(data, workers=1):
+    """Mean of every numeric column per (latitude, longitude, year_month)."""
+    require_columns(data, ['time', 'latitude', 'longitude'],
+                    "Data must contain 'time', 'latitude', and 'longitude' columns for aggregation.")
+    data, _ = ensure_datetime(data)
+    codes, periods = period_codes(data['time'], 'month')
+    return parallel_aggregate_groups(data, codes, periods.to_period('M'), period_column='year_month', workers=workers)
+
+
+def resample_time_series(data, frequency='month', aggregates=('mean',), workers=1):
+    """
+    Aggregates ('mean', 'min', 'max', 'sum', 'count') of every numeric column per
+    (latitude, longitude, period) at any frequency of resampling.FREQUENCIES; the period start
+    is in 'time'.
+    """
+    require_columns(data, ['time', 'latitude', 'longitude'],
+                    "Data must contain 'time', 'latitude', and 'longitude' columns for aggregation.")
+    codes, periods = period_codes(data['time'], frequency)
+    return parallel_aggregate_groups(data, codes, periods, aggregates, workers=workers)
+
+
+def aggregate_seasonally(data, calendar=DEFAULT_SEASON_CALENDAR, workers=1):
+    """Mean of every numeric column per (latitude, longitude, season)."""
+    require_columns(data, ['time', 'latitude', 'longitude'],
+                    "Data must contain 'time', 'latitude', and 'longitude' columns for aggregation.")
+    data, _ = ensure_datetime(data)
+    seasons = assign_seasons(data['time'], calendar)
+    # Season categories are sorted by name, so seasons come out in the order of grouping on strings
+    return parallel_aggregate_groups(data, seasons.cat.codes.to_numpy(dtype=np.int64),
+                                     pd.Index(seasons.cat.categories, dtype=str), period_column='season',
+                                     workers=workers)
+
+
+SEASON_PIVOT_VALUES = ['PSurf', 'Qair', 'Rainf', 'Snowf', 'Tair', 'Wind']
+
+
+def season_pivot_values(data):
+    """Default value columns of the seasonal pivot: the standard variables present, else every numeric column."""
+    present = [column for column in SEASON_PIVOT_VALUES if column in data.columns]
+    return present or [c for c in value_columns(data) if c != 'season']
+
+
+def estimate_season_pivot(data, values=None):
+    """(rows, columns, bytes) of reduce_by_season(data, values), without building it."""
+    values = season_pivot_values(data) if values is None else list(values)
+    return estimate_pivot(data, 'season', values)
+
+
+def reduce_by_season(data, values=None, aggregate='mean'):
+    """
+    One row per (latitude, longitude) with a '<variable><season>' column per variable and season.
+    values defaults to season_pivot_values(data); rows repeating a (latitude, longitude, season)
+    are combined with aggregate first.
+    """
+    values = season_pivot_values(data) if values is None else list(values)
+    return pivot_by_cell(data, 'season', values, aggregate)
+
+
+# Discretization
+
+DISCRETIZATION_LABELS = ["Very Low", "Low", "Medium", "High", "Very High"]
+
+
+def discretization_columns(data):
+    """Numeric columns eligible for discretization (coordinates and geometry excluded)."""
+    numerical_columns = data.select_dtypes(include=['number']).columns.tolist()
+    excluded_columns = {'latitude', 'longitude', 'geometry'}
+    return [col for col in numerical_columns if col not in excluded_columns]
+
+
+def discretize_series(series, method, bins, labels, display_intervals=False):
+    """
+    Bin a numeric Series with equal width (pd.cut) or equal frequency (pd.qcut) intervals.
+    Labels are taken straight from the categorical codes: bin i gets labels[i], missing values stay missing.
+    """
+    if method == "equal_width":
+        discretized = pd.cut(series, bins=bins)
+    elif method == "equal_frequency":
+        discretized = pd.qcut(series, q=bins)
+    else:
+        raise ValueError(f"Unknown discretization method: {method}")
+
+    if display_intervals:
+        return discretized
+    # Bin i maps to labels[i]; with fewer bins than labels only the first labels are used
+    # (qcut raises on duplicate edges, as before, rather than merging bins)
+    categories = labels[:len(discretized.cat.categories)]
+    return pd.Series(pd.Categorical.from_codes(discretized.cat.codes, categories=categories, ordered=True),
+                     index=series.index, name=series.name)
+
+
+def discretize(data, columns, method, bins=5, labels=DISCRETIZATION_LABELS, display_intervals=False, max_workers=None):
+    """
+    Discretize several columns concurrently (columns=None: every discretization column).
+    Returns (data, {column: error message}). Only the binned columns are replaced; the rest of the
+    frame shares the input's buffers.
+    """
+    if columns is None:
+        columns = discretization_columns(data)
+    discretized_columns = {}
+    errors = {}
+    max_workers = max_workers or min(len(columns), os.cpu_count() or 1) or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {col: executor.submit(discretize_series, data[col], method, bins, labels, display_intervals)
+                   for col in columns}
+        for col, future in futures.items():
+            try:
+                discretized_columns[col] = future.result()
+            except Exception as e:
+                errors[col] = str(e)
+
+    # Shallow copy: untouched columns keep their buffers, binned columns are swapped in
+    updated = data.copy(deep=False)
+    for col, values in discretized_columns.items():
+        updated[col] = values
+    return updated, errors
+
+
+# Merging
+
+# Decimals kept when matching coordinates (5 decimals is about 1 m)
+DEFAULT_COORDINATE_PRECISION = 5
+
+
+def merge_on_coordinates(primary, secondary, precision=DEFAULT_COORDINATE_PRECISION):
+    """
+    Inner join of two datasets on 'latitude' and 'longitude' rounded to `precision` decimals,
+    matched as int64 grid keys so that tiny float differences do not drop rows.
+    """
+    if not set(COORDINATE_COLUMNS).issubset(primary.columns) or not set(COORDINATE_COLUMNS).issubset(secondary.columns):
+        raise ValueError("Both files must have 'latitude' and 'longitude' columns for merging.")
+    return join_on_coordinates(primary, secondary, precision)
+
+
+def merge_on_coordinates_streaming(primary, secondary_path, precision=DEFAULT_COORDINATE_PRECISION,
+                                   chunk_size=1000000, progress=None):
+    """
+    Same join as merge_on_coordinates with the secondary CSV read chunk by chunk, so only its
+    matched rows are held in memory. progress, if given, is called with the fraction of the file
+    read and returns False to cancel (the function then returns None).
+    """
+    if not set(COORDINATE_COLUMNS).issubset(primary.columns):
+        raise ValueError("Both files must have 'latitude' and 'longitude' columns for merging.")
+    total_bytes = os.path.getsize(secondary_path)
+    with open(secondary_path, 'rb') as handle:
+        report = None
+        if progress is not None:
+            report = lambda: progress(handle.tell() / total_bytes if total_bytes else 1.0)
+        return join_on_coordinates(primary, pd.read_csv(handle, chunksize=chunk_size), precision, report)
+
+
+def merge_nearest(primary, secondary_path, max_distance_km=None):
+    """
+    Join every primary row to the nearest point of the secondary CSV (great-circle distance),
+    for grids of different resolutions. The secondary KD-tree is cached per file, and rows
+    farther than max_distance_km from any secondary point are dropped.
+    """
+    if not set(COORDINATE_COLUMNS).issubset(primary.columns):
+        raise ValueError("Both files must have 'latitude' and 'longitude' columns for merging.")
+    secondary, index = load_point_index(secondary_path)
+    return join_nearest(primary, secondary, index, max_distance_km)
+
+
+def _attach_to_soil(soil_gdf, aggregated_climate):
+    """Left join per-polygon climate values (indexed like soil_gdf) onto the soil layer."""
+    reduced_data = pd.merge(soil_gdf, aggregated_climate, left_index=True, right_index=True, how='left')
+    return reduced_data.reset_index(drop=True)
+
+
+def reduce_by_soil_polygons(climate_data, soil_data_path):
+    """Mean of the climate columns over the points falling within each soil polygon."""
+    # Parsed soil polygons and their STRtree, reused across reductions against the same soil file
+    soil_gdf, soil_index = load_soil_index(soil_data_path)
+
+    # Validate climate data has 'longitude' and 'latitude' columns
+    if 'longitude' not in climate_data.columns or 'latitude' not in climate_data.columns:
+        raise ValueError("Climate data must contain 'longitude' and 'latitude' columns.")
+
+    # Spatial join: points built in bulk from the coordinate arrays and matched against the tree
+    point_positions, polygon_positions = soil_index.join(climate_data['longitude'].to_numpy(),
+                                                         climate_data['latitude'].to_numpy())
+
+    # Group climate data by soil polygon and calculate the mean for each group
+    climate_columns = [col for col in climate_data.columns if col not in ['latitude', 'longitude', 'geometry']]
+    matched_climate = climate_data[climate_columns].iloc[point_positions]
+    aggregated_climate = matched_climate.groupby(polygon_positions).mean(numeric_only=True)
+
+    # Retain unique soil data and attach the aggregated climate data by polygon position
+    aggregated_climate.index = soil_gdf.index[aggregated_climate.index]
+    return _attach_to_soil(soil_gdf, aggregated_climate)
+
+
+def reduce_by_soil_polygons_streaming(climate_data_path, soil_data_path, chunk_size=500000, progress=None):
+    """
+    Same per-polygon means as reduce_by_soil_polygons, but the climate file is read chunk by chunk.
+    Each chunk is joined against the soil polygons and folded into running per-polygon sums and
+    counts, so memory is bounded by the chunk size and the number of polygons, not by the file.
+    progress, if given, is called with the fraction of the file read and returns False to cancel
+    (the function then returns None).
+    """
+    soil_gdf, soil_index = load_soil_index(soil_data_path)
+    n_polygons = len(soil_index)
+    total_bytes = os.path.getsize(climate_data_path)
+
+    climate_columns = None
+    sums = counts = None
+    with open(climate_data_path, 'rb') as handle:
+        for chunk in pd.read_csv(handle, chunksize=chunk_size):
+            if climate_columns is None:
+                if 'longitude' not in chunk.columns or 'latitude' not in chunk.columns:
+                    raise ValueError("Climate data must contain 'longitude' and 'latitude' columns.")
+                # Same columns the in-memory mean keeps: numeric, non-coordinate
+                candidates = [col for col in chunk.columns if col not in ['latitude', 'longitude', 'geometry']]
+                climate_columns = chunk[candidates].select_dtypes(include=['number']).columns.tolist()
+                sums = np.zeros((n_polygons, len(climate_columns)))
+                counts = np.zeros((n_polygons, len(climate_columns)), dtype=np.int64)
+
+            point_positions, polygon_positions = soil_index.join(chunk['longitude'].to_numpy(),
+                                                                 chunk['latitude'].to_numpy())
+            for j, col in enumerate(climate_columns):
+                values = pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=float)[point_positions]
+                valid = ~np.isnan(values)
+                sums[:, j] += np.bincount(polygon_positions, weights=np.where(valid, values, 0.0), minlength=n_polygons)
+                counts[:, j] += np.bincount(polygon_positions[valid], minlength=n_polygons)
+
+            if progress is not None and progress(handle.tell() / total_bytes if total_bytes else 1.0) is False:
+                return None
+
+    if climate_columns is None:
+        raise ValueError("Climate data file is empty.")
+
+    # Polygons without any matched point keep NaN, as with the left join of the in-memory path
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    aggregated_climate = pd.DataFrame(means, index=soil_gdf.index, columns=climate_columns)
+    return _attach_to_soil(soil_gdf, aggregated_climate)
+
+
+# Export
+
+def save_dataset(data, file_path, progress=None):
+    """
+    Write the dataset without the index; the format (CSV, .csv.gz, Parquet or Feather) follows
+    the extension. Written in chunks, see data_export.export_dataset.
+    """
+    return export_dataset(data, file_path, progress=progress)
@@ -2,46 +2,93 @@ import pandas as pd
 import matplotlib
 matplotlib.use('QtAgg')
 
-import matplotlib.pyplot as plt
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QInputDialog, QMessageBox
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg, NavigationToolbar2QT
+from matplotlib.figure import Figure
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QInputDialog, QMessageBox, QCheckBox,
+                             QComboBox, QLabel)
+from density_plot import DensityScatter
+from outlier_stats import column_values
+from histogram_cache import BIN_CHOICES
 
 class DataVisualizationDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
         self.setWindowTitle("Data Visualization")
-        self.setGeometry(200, 200, 400, 200)
+        self.setGeometry(200, 200, 900, 700)
 
         # Layout for the data visualization options
         layout = QVBoxLayout()
+        buttons_layout = QHBoxLayout()
 
         # Buttons for different types of plots
         self.boxplot_button = QPushButton("Boxplot")
         self.boxplot_button.clicked.connect(self.plot_boxplot)
-        layout.addWidget(self.boxplot_button)
+        buttons_layout.addWidget(self.boxplot_button)
 
         self.scatter_button = QPushButton("Scatter Plot")
         self.scatter_button.clicked.connect(self.plot_scatter)
-        layout.addWidget(self.scatter_button)
+        buttons_layout.addWidget(self.scatter_button)
 
         self.histogram_button = QPushButton("Histogram")
         self.histogram_button.clicked.connect(self.plot_histogram)
-        layout.addWidget(self.histogram_button)
+        buttons_layout.addWidget(self.histogram_button)
+
+        layout.addLayout(buttons_layout)
+
+        # Density rendering: bin scatter points into a grid instead of drawing every marker
+        self.density_checkbox = QCheckBox("Density rendering for scatter plots (large datasets)")
+        self.density_checkbox.setChecked(True)
+        layout.addWidget(self.density_checkbox)
+
+        # Histogram options; changing them redraws from the cached counts (only bin counts that can
+        # be derived from them are offered, so the dataset is never read again)
+        histogram_layout = QHBoxLayout()
+        histogram_layout.addWidget(QLabel("Histogram bins:"))
+        self.bins_combo = QComboBox()
+        self.bins_combo.addItems([str(bins) for bins in BIN_CHOICES])
+        self.bins_combo.setCurrentText("20")
+        self.bins_combo.currentIndexChanged.connect(self.draw_histogram)
+        histogram_layout.addWidget(self.bins_combo)
+        self.groups_checkbox = QCheckBox("Show groups")
+        self.groups_checkbox.setChecked(True)
+        self.groups_checkbox.toggled.connect(self.draw_histogram)
+        histogram_layout.addWidget(self.groups_checkbox)
+        histogram_layout.addStretch()
+        layout.addLayout(histogram_layout)
+        self.current_histogram = None  # (column, group column) of the histogram on the canvas
+
+        # Plots are drawn in this embedded canvas; the toolbar zooms and pans
+        self.figure = Figure(figsize=(8, 6))
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.toolbar = NavigationToolbar2QT(self.canvas, self)
+        layout.addWidget(self.toolbar)
+        layout.addWidget(self.canvas)
+        self.density_scatter = None
 
         # Set dialog layout
         self.setLayout(layout)
 
+    def new_axes(self):
+        """Clears the canvas and returns fresh axes to draw on."""
+        if self.density_scatter is not None:
+            self.density_scatter.stop()
+            self.density_scatter = None
+        self.figure.clear()
+        self.toolbar.update()  # Forget the zoom history of the previous plot
+        return self.figure.add_subplot(111)
+
     def plot_boxplot(self):
         if self.parent.full_data is not None:
-            columns = self.parent.full_data.select_dtypes(include=['float64', 'int64']).columns.tolist()
+            columns = self.parent.full_data.select_dtypes(include=['number']).columns.tolist()
             if columns:
                 column, ok = QInputDialog.getItem(self, "Select Column", "Choose column for boxplot:", columns, 0, False)
                 if ok:
-                    plt.figure(figsize=(8, 6))
-                    self.parent.full_data.boxplot(column=column)
-                    plt.title(f'Boxplot of {column}')
-                    plt.ylabel(column)
-                    plt.show()
+                    ax = self.new_axes()
+                    self.parent.full_data.boxplot(column=column, ax=ax)
+                    ax.set_title(f'Boxplot of {column}')
+                    ax.set_ylabel(column)
+                    self.canvas.draw_idle()
             else:
                 QMessageBox.warning(self, "No Numeric Columns", "No numeric columns available for boxplot.")
         else:
@@ -49,7 +96,7 @@ class DataVisualizationDialog(QDialog):
 
     def plot_scatter(self):
         if self.parent.full_data is not None:
-            columns = self.parent.full_data.select_dtypes(include=['float64', 'int64']).columns.tolist()
+            columns = self.parent.full_data.select_dtypes(include=['number']).columns.tolist()
             if len(columns) >= 2:
                 col_x, ok_x = QInputDialog.getItem(self, "Select X Column", "Choose X column for scatter plot:", columns, 0, False)
                 if ok_x:
@@ -58,20 +105,26 @@ class DataVisualizationDialog(QDialog):
                         # Calculate Pearson correlation coefficient
                         correlation = self.parent.full_data[[col_x, col_y]].corr().iloc[0, 1]
 
-                        # Create scatter plot
-                        plt.figure(figsize=(8, 6))
-                        plt.scatter(self.parent.full_data[col_x], self.parent.full_data[col_y], alpha=0.5)
-                        plt.title(f'Scatter Plot of {col_x} vs {col_y}')
-                        plt.xlabel(col_x)
-                        plt.ylabel(col_y)
+                        # Create scatter plot; density rendering re-bins the visible range on zoom
+                        ax = self.new_axes()
+                        x = column_values(self.parent.full_data[col_x])
+                        y = column_values(self.parent.full_data[col_y])
+                        if self.density_checkbox.isChecked():
+                            self.density_scatter = DensityScatter(ax, x, y)
+                            self.figure.colorbar(self.density_scatter.image, ax=ax, label='Points per cell')
+                        else:
+                            ax.scatter(x, y, alpha=0.5)
+                        ax.set_title(f'Scatter Plot of {col_x} vs {col_y}')
+                        ax.set_xlabel(col_x)
+                        ax.set_ylabel(col_y)
 
                         # Display Pearson correlation coefficient on the plot
-                        plt.annotate(f'Pearson Correlation: {correlation:.2f}', 
+                        ax.annotate(f'Pearson Correlation: {correlation:.2f}', 
                                      xy=(0.05, 0.95), xycoords='axes fraction', 
                                      fontsize=12, color='red', 
                                      bbox=dict(boxstyle="round,pad=0.3", edgecolor='red', facecolor='white'))
 
-                        plt.show()
+                        self.canvas.draw_idle()
             else:
                 QMessageBox.warning(self, "Insufficient Columns", "Need at least two numeric columns for scatter plot.")
         else:
@@ -80,7 +133,7 @@ class DataVisualizationDialog(QDialog):
     def plot_histogram(self):
         if self.parent.full_data is not None:
             # Check for numeric columns
-            columns = self.parent.full_data.select_dtypes(include=['float64', 'int64']).columns.tolist()
+            columns = self.parent.full_data.select_dtypes(include=['number']).columns.tolist()
             if not columns:
                 QMessageBox.warning(self, "No Numeric Columns", "No numeric columns available for histogram.")
                 return
@@ -89,31 +142,39 @@ class DataVisualizationDialog(QDialog):
             discretized_columns = self.parent.full_data.select_dtypes(include=['category', 'object']).columns.tolist()
             column, ok_col = QInputDialog.getItem(self, "Select Column", "Choose column for histogram:", columns, 0, False)
             if ok_col:
+                discretize_column = None
                 if discretized_columns:
                     # Optional selection for discretization
-                    discretize_column, ok_discretize = QInputDialog.getItem(
+                    group, ok_discretize = QInputDialog.getItem(
                         self, "Select Discretized Column", "Choose discretized column (optional):", discretized_columns, 0, True)
                     if ok_discretize:
-                        plt.figure(figsize=(8, 6))
-                        self.parent.full_data.groupby(discretize_column)[column].plot.hist(alpha=0.5, legend=True)
-                        plt.title(f'Histogram of {column} grouped by {discretize_column}')
-                        plt.xlabel(column)
-                        plt.show()
-                    else:
-                        # Standard histogram without discretization
-                        plt.figure(figsize=(8, 6))
-                        self.parent.full_data[column].plot.hist(bins=20, alpha=0.7)
-                        plt.title(f'Histogram of {column}')
-                        plt.xlabel(column)
-                        plt.ylabel('Frequency')
-                        plt.show()
-                else:
-                    # No discretized columns available; plot a simple histogram
-                    plt.figure(figsize=(8, 6))
-                    self.parent.full_data[column].plot.hist(bins=20, alpha=0.7)
-                    plt.title(f'Histogram of {column}')
-                    plt.xlabel(column)
-                    plt.ylabel('Frequency')
-                    plt.show()
+                        discretize_column = group
+                self.current_histogram = (column, discretize_column)
+                self.draw_histogram()
         else:
             QMessageBox.warning(self, "No Data", "Please import a dataset first.")
+
+    def draw_histogram(self):
+        """Draws the current histogram from the counts cached on the viewer, sharing bin edges across groups."""
+        if self.current_histogram is None or self.parent.full_data is None:
+            return
+        column, discretize_column = self.current_histogram
+        if not self.groups_checkbox.isChecked():
+            discretize_column = None
+        edges, counts, labels = self.parent.histograms.get(
+            self.parent.full_data, self.parent.data_version, column, discretize_column, int(self.bins_combo.currentText()))
+        ax = self.new_axes()
+        if edges is None:
+            ax.set_title(f'No values to plot in {column}')
+        elif discretize_column is None:
+            ax.stairs(counts[0], edges, fill=True, alpha=0.7)
+            ax.set_title(f'Histogram of {column}')
+            ax.set_ylabel('Frequency')
+        else:
+            for label, row in zip(labels, counts):
+                if row.any():
+                    ax.stairs(row, edges, fill=True, alpha=0.5, label=str(label))
+            ax.legend()
+            ax.set_title(f'Histogram of {column} grouped by {discretize_column}')
+        ax.set_xlabel(column)
+        self.canvas.draw_idle()
@@ -0,0 +1,96 @@
+import numpy as np
+from matplotlib.colors import LogNorm
+
+# Largest number of points binned for the quick first pass after a zoom
+PREVIEW_POINTS = 1000000
+
+
+def density_grid(x, y, x_range, y_range, shape, step=1):
+    """
+    Count points per cell of a shape=(nx, ny) grid over x_range/y_range with one bincount.
+    With step > 1 only every step-th point is binned and counts are scaled back up.
+    """
+    if step > 1:
+        x, y = x[::step], y[::step]
+    nx, ny = shape
+    (x0, x1), (y0, y1) = x_range, y_range
+    ix = np.floor((x - x0) * (nx / (x1 - x0))).astype(np.int64)
+    iy = np.floor((y - y0) * (ny / (y1 - y0))).astype(np.int64)
+    inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+    counts = np.bincount(ix[inside] * ny + iy[inside], minlength=nx * ny).reshape(nx, ny)
+    return counts * step if step > 1 else counts
+
+
+def padded_range(values):
+    low, high = float(values.min()), float(values.max())
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return low, high
+
+
+class DensityScatter:
+    """
+    Scatter plot of any number of points drawn as a 2D count image, one cell per screen pixel
+    or two. When the view is zoomed or panned the visible range is re-binned: first from a
+    subsample for a quick preview, then from every point.
+    """
+
+    def __init__(self, ax, x, y, cmap='viridis', max_bins=800, delay=150):
+        finite = np.isfinite(x) & np.isfinite(y)
+        self.x = np.ascontiguousarray(x[finite])
+        self.y = np.ascontiguousarray(y[finite])
+        self.ax = ax
+        self.max_bins = max_bins
+        self.extent = None
+        self.full_resolution = False
+
+        x_range, y_range = (padded_range(self.x), padded_range(self.y)) if len(self.x) else ((0, 1), (0, 1))
+        self.image = ax.imshow(np.ma.masked_equal(np.zeros((1, 1)), 0), origin='lower', aspect='auto',
+                               interpolation='nearest', cmap=cmap, extent=(*x_range, *y_range),
+                               norm=LogNorm(vmin=1, vmax=2))
+        ax.set_xlim(x_range)
+        ax.set_ylim(y_range)
+        self.rebin(step=1)
+        ax.set_autoscale_on(False)
+
+        # Re-bin shortly after the limits stop changing, not on every intermediate pan step
+        canvas = ax.figure.canvas
+        self.preview_timer = canvas.new_timer(interval=delay)
+        self.preview_timer.single_shot = True
+        self.preview_timer.add_callback(self.refresh, True)
+        self.full_timer = canvas.new_timer(interval=10)
+        self.full_timer.single_shot = True
+        self.full_timer.add_callback(self.refresh, False)
+        ax.callbacks.connect('xlim_changed', self.on_limits_changed)
+        ax.callbacks.connect('ylim_changed', self.on_limits_changed)
+
+    def grid_shape(self):
+        width, height = self.ax.bbox.width, self.ax.bbox.height
+        return (int(min(max(width / 2, 50), self.max_bins)), int(min(max(height / 2, 50), self.max_bins)))
+
+    def stop(self):
+        self.preview_timer.stop()
+        self.full_timer.stop()
+
+    def on_limits_changed(self, ax):
+        if self.extent != (*ax.get_xlim(), *ax.get_ylim()):
+            self.full_timer.stop()
+            self.preview_timer.start()
+
+    def refresh(self, preview):
+        step = max(1, len(self.x) // PREVIEW_POINTS) if preview else 1
+        self.rebin(step)
+        self.ax.figure.canvas.draw_idle()
+        if step > 1:
+            self.full_timer.start()
+
+    def rebin(self, step=1):
+        """Bin the points in the current view and update the image and its colour scale."""
+        x_range, y_range = self.ax.get_xlim(), self.ax.get_ylim()
+        counts = density_grid(self.x, self.y, x_range, y_range, self.grid_shape(), step)
+        self.extent = (*x_range, *y_range)
+        self.full_resolution = step == 1
+        self.image.set_data(np.ma.masked_equal(counts.T, 0))
+        self.image.set_extent(self.extent)
+        self.image.set_clim(1, max(int(counts.max()), 2))
+        return counts
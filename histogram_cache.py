@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+from outlier_stats import column_values
+
+# Bin counts offered in the viewer: the divisors of 5040 up to 500 (every count from 1 to 10, 12,
+# 15, 20, ...). Counts are cached over the union of their bin edges, so each of them is derived
+# from the cache exactly
+BIN_CHOICES = [bins for bins in range(1, 501) if 5040 % bins == 0]
+
+
+def value_range(values):
+    """(low, high) used for the bin edges, widened like np.histogram for constant data; None if empty."""
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return None
+    low, high = float(finite.min()), float(finite.max())
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return low, high
+
+
+def group_codes(series):
+    """Integer group code per row (-1 for missing) and the group labels, in sorted order."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), list(series.cat.categories)
+    codes, labels = pd.factorize(series, sort=True)
+    return codes, list(labels)
+
+
+def fine_edges(bounds):
+    """
+    Sorted union of the bin edges of every bin count in BIN_CHOICES, computed like np.histogram
+    (np.linspace over bounds), so every histogram edge is exactly one of them.
+    """
+    return np.unique(np.concatenate([np.linspace(bounds[0], bounds[1], bins + 1) for bins in BIN_CHOICES]))
+
+
+def grouped_counts(values, codes, n_groups, edges):
+    """
+    Counts per (group, interval between consecutive edges), from one bincount. Intervals are
+    half-open except the last, as in np.histogram. Row 0 holds rows without a group; rows 1..
+    hold the groups in code order.
+    """
+    bins = len(edges) - 1
+    valid = np.isfinite(values)
+    positions = np.searchsorted(edges, values[valid], side='right') - 1
+    np.clip(positions, 0, bins - 1, out=positions)
+    flat = (codes[valid].astype(np.int64) + 1) * bins + positions
+    return np.bincount(flat, minlength=(n_groups + 1) * bins).reshape(n_groups + 1, bins)
+
+
+class HistogramCache:
+    """
+    Histogram counts of the viewer's dataset, tied to a dataset version.
+    Each (column, group column) pair is scanned once over the fine edges of its value range, shared
+    by all groups; every bin count in BIN_CHOICES and the ungrouped histogram are derived from those
+    counts without reading the data again.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.base = {}     # (column, group column) -> (bounds, fine edges, counts incl. the no-group row, labels)
+
+    def invalidate(self):
+        self.version = None
+        self.base = {}
+
+    def _base(self, data, column, group_column):
+        key = (column, group_column)
+        if key not in self.base:
+            grouped = [k for k in self.base if k[0] == column and self.base[k][2] is not None]
+            if group_column is None and grouped:
+                # Ungrouped counts are the sum over any grouping of the same column
+                bounds, edges, counts, _ = self.base[grouped[0]]
+                self.base[key] = (bounds, edges, counts.sum(axis=0, keepdims=True), [None])
+            else:
+                values = column_values(data[column])
+                bounds = value_range(values)
+                if group_column is None:
+                    codes, labels, n_groups = np.full(len(values), -1), [None], 0
+                else:
+                    codes, labels = group_codes(data[group_column])
+                    n_groups = len(labels)
+                edges = counts = None
+                if bounds is not None:
+                    edges = fine_edges(bounds)
+                    counts = grouped_counts(values, codes, n_groups, edges)
+                self.base[key] = (bounds, edges, counts, labels)
+        return self.base[key]
+
+    def get(self, data, version, column, group_column=None, bins=20):
+        """(edges, counts, labels): counts has one row per label; labels is [None] without grouping."""
+        if bins not in BIN_CHOICES:
+            raise ValueError(f"Unsupported number of histogram bins: {bins}")
+        if version != self.version:
+            self.invalidate()
+            self.version = version
+        bounds, fine, counts, labels = self._base(data, column, group_column)
+        if bounds is None:
+            return None, None, labels
+        edges = np.linspace(bounds[0], bounds[1], bins + 1)
+        # Every edge is one of the fine edges: sum the fine intervals between consecutive edges
+        counts = np.add.reduceat(counts, np.searchsorted(fine, edges[:-1]), axis=1)
+        # Row 0 of grouped counts holds rows without a group
+        return edges, (counts if group_column is None else counts[1:]), labels
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+
+def _numpy_key(values):
+    return values.__array_interface__['data'][0], values.strides, values.nbytes
+
+
+def _buffer_key(series):
+    """
+    Identity of the memory behind a column, read without scanning the values: (address, strides,
+    size) of a NumPy buffer, of the codes of a categorical or of the values and mask of a
+    nullable column; the offset, length and buffer addresses of every chunk of an Arrow-backed
+    column; otherwise the id of the extension array.
+    """
+    if isinstance(series.dtype, np.dtype):
+        return _numpy_key(series.to_numpy())
+    array = series.array
+    if isinstance(array, pd.Categorical):
+        # The categories are part of the dtype, which is compared separately
+        return _numpy_key(array.codes)
+    chunked = getattr(array, '_pa_array', None)
+    if chunked is not None:
+        return tuple((chunk.offset, len(chunk), tuple(buffer.address for buffer in chunk.buffers() if buffer is not None))
+                     for chunk in chunked.chunks)
+    if isinstance(getattr(array, '_data', None), np.ndarray) and isinstance(getattr(array, '_mask', None), np.ndarray):
+        return _numpy_key(array._data), _numpy_key(array._mask)
+    return id(array)
+
+
+def _same_values(previous, current):
+    """
+    True if two columns (with equal indexes) share their data. Columns with equal contents in
+    different buffers count as changed, so recording a version never compares values.
+    """
+    if previous is current:
+        return True
+    if len(previous) != len(current) or previous.dtype != current.dtype:
+        return False
+    return _buffer_key(previous) == _buffer_key(current)
+
+
+class Snapshot:
+    """
+    One dataset version: column names, one Series per column and the row index.
+    Columns unchanged since the previous snapshot are the previous snapshot's Series objects, so
+    their buffers are shared instead of duplicated.
+    """
+
+    def __init__(self, columns, series, index):
+        self.columns = columns
+        self.series = series
+        self.index = index
+
+    @classmethod
+    def from_frame(cls, data, previous=None):
+        previous_by_name = {}
+        if previous is not None:
+            previous_by_name = {name: s for name, s in zip(previous.columns, previous.series)}
+        index = data.index
+        same_index = previous is not None and (previous.index is index or previous.index.equals(index))
+        if same_index:
+            index = previous.index
+
+        series = []
+        for position in range(data.shape[1]):
+            current = data.iloc[:, position]
+            earlier = previous_by_name.get(data.columns[position])
+            if same_index and earlier is not None and _same_values(earlier, current):
+                series.append(earlier)
+            else:
+                series.append(current)
+        return cls(list(data.columns), series, index)
+
+    def to_frame(self):
+        """Rebuild the DataFrame without copying the column buffers."""
+        data = pd.DataFrame({position: s for position, s in enumerate(self.series)}, index=self.index, copy=False)
+        data.columns = pd.Index(self.columns)
+        return data
+
+    def buffers(self):
+        """(key, bytes) of every column; columns sharing memory have the same key."""
+        result = []
+        for s in self.series:
+            result.append((_buffer_key(s), s.memory_usage(index=False, deep=False)))
+        return result
+
+
+class DataHistory:
+    """
+    Undo/redo stack of dataset versions with column-level copy-on-write.
+    Recording a version only holds on to the columns that changed; undo and redo rebuild a frame
+    from the stored columns without copying them. Relies on operations replacing columns rather
+    than writing into existing column buffers.
+    """
+
+    def __init__(self, max_steps=10):
+        self.max_steps = max_steps
+        self.undo_stack = []   # last item is the current version
+        self.redo_stack = []
+
+    def record(self, data):
+        """Push a new current version (None clears the history)."""
+        if data is None:
+            self.clear()
+            return
+        previous = self.undo_stack[-1] if self.undo_stack else None
+        self.undo_stack.append(Snapshot.from_frame(data, previous))
+        # Current version plus max_steps earlier ones
+        del self.undo_stack[:-(self.max_steps + 1)]
+        self.redo_stack.clear()
+
+    def can_undo(self):
+        return len(self.undo_stack) > 1
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        """Step back one version and return its DataFrame."""
+        if not self.can_undo():
+            return None
+        self.redo_stack.append(self.undo_stack.pop())
+        return self.undo_stack[-1].to_frame()
+
+    def redo(self):
+        """Step forward one version and return its DataFrame."""
+        if not self.can_redo():
+            return None
+        self.undo_stack.append(self.redo_stack.pop())
+        return self.undo_stack[-1].to_frame()
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def memory_usage(self):
+        """Bytes held by all stored versions, counting each shared column buffer once."""
+        seen = {}
+        for snapshot in self.undo_stack + self.redo_stack:
+            for key, size in snapshot.buffers():
+                seen[key] = size
+        return sum(seen.values())
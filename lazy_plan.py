@@ -0,0 +1,290 @@
+"""
+Lazy execution of dataset operations.
+Operations are recorded as a plan of steps and run together: row filters are combined into one
+mask that is applied once, element-wise column steps run back to back on each column, and
+columns that a later aggregation does not read are never computed.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import data_operations
+import outlier_stats
+from normalizer import Normalizer
+from column_stats import is_numeric_column
+
+
+class FilterStep:
+    """Keeps the rows for which mask(frame) is True; frame holds the columns returned by reads(schema)."""
+
+    def __init__(self, title, reads, mask):
+        self.title = title
+        self.reads = reads
+        self.mask = mask
+
+
+class MapStep:
+    """
+    Replaces, one column at a time, every column for which selects(name, numeric) is True with
+    transform(series, notes). Statistics inside transform only see that column.
+    """
+
+    def __init__(self, title, selects, transform, output_numeric=True):
+        self.title = title
+        self.selects = selects
+        self.transform = transform
+        self.output_numeric = output_numeric
+
+
+class FrameStep:
+    """Whole-frame operation (aggregation, pivot, merge); needs(schema) lists the columns it reads, None for all."""
+
+    def __init__(self, title, fn, needs=None):
+        self.title = title
+        self.fn = fn
+        self.needs = needs if needs is not None else (lambda schema: None)
+
+
+# Steps matching the eager operations in data_operations
+
+def remove_outliers_step():
+    def mask(frame):
+        return ~outlier_stats.outlier_mask(frame, outlier_stats.compute_outlier_statistics(frame))
+    return FilterStep("Remove outliers", lambda schema: [c for c, numeric in schema.items() if numeric], mask)
+
+
+def remove_nan_rows_step():
+    return FilterStep("Remove rows with NaN", lambda schema: list(schema), lambda frame: frame.notna().all(axis=1).to_numpy())
+
+
+def replace_outliers_step(method):
+    """'mean', 'median' or 'cap', per numeric column with that column's own statistics."""
+    def transform(series, notes):
+        return data_operations.clean_outliers(series.to_frame(), method)[series.name]
+    titles = {'mean': "Replace outliers with mean", 'median': "Replace outliers with median", 'cap': "Cap outliers"}
+    return MapStep(titles[method], lambda name, numeric: numeric, transform)
+
+
+def clean_outliers_step(method):
+    return remove_outliers_step() if method == 'remove' else replace_outliers_step(method)
+
+
+def _is_feature(name, numeric):
+    return numeric and name not in data_operations.NON_FEATURE_COLUMNS
+
+
+def normalize_step(method, dtype='float64'):
+    """Min-max or z-score scaling of the numeric feature columns, skipping columns without spread."""
+    reasons = {'min_max': "insufficient range", 'zscore': "low variance"}
+    titles = {'min_max': "Min-max normalization", 'zscore': "Z-score normalization"}
+    if method not in titles:
+        raise ValueError(f"Unknown normalization method: {method}")
+
+    def transform(series, notes):
+        frame = series.to_frame()
+        normalizer = Normalizer(method, dtype).fit(frame)
+        if normalizer.skipped:
+            notes.append(f"{titles[method]} skipped '{series.name}' ({reasons[method]})")
+        return normalizer.transform(frame)[series.name]
+
+    return MapStep(titles[method], _is_feature, transform)
+
+
+def discretize_step(columns, method, bins=5, labels=data_operations.DISCRETIZATION_LABELS, display_intervals=False,
+                    strict=False):
+    """
+    Binning of the given columns (None: every discretization column at that point of the plan).
+    Columns that cannot be binned are left as they are and noted, or raise when strict.
+    """
+    def selects(name, numeric):
+        if columns is None:
+            return numeric and name not in ('latitude', 'longitude', 'geometry')
+        return name in columns
+
+    def transform(series, notes):
+        try:
+            return data_operations.discretize_series(series, method, bins, labels, display_intervals)
+        except Exception as e:
+            if strict:
+                raise ValueError(f"{series.name}: {e}")
+            notes.append(f"Discretization of '{series.name}' failed: {e}")
+            return series
+
+    return MapStep(f"Discretize ({method}, {bins} bins)", selects, transform, output_numeric=False)
+
+
+def _mean_by_key_needs(schema):
+    return ['time', 'latitude', 'longitude'] + [c for c, numeric in schema.items() if numeric and c not in ('latitude', 'longitude')]
+
+
+def aggregate_monthly_step(workers=1):
+    return FrameStep("Aggregate monthly", lambda data: data_operations.aggregate_monthly(data, workers),
+                     _mean_by_key_needs)
+
+
+def resample_step(frequency, aggregates=('mean',), workers=1):
+    return FrameStep(f"Resample ({frequency}: {', '.join(aggregates)})",
+                     lambda data: data_operations.resample_time_series(data, frequency, aggregates, workers),
+                     _mean_by_key_needs)
+
+
+def aggregate_seasonally_step(calendar=data_operations.DEFAULT_SEASON_CALENDAR, workers=1):
+    return FrameStep("Aggregate seasonally", lambda data: data_operations.aggregate_seasonally(data, calendar, workers),
+                     _mean_by_key_needs)
+
+
+def reduce_by_season_step(values=None, aggregate='mean'):
+    """values=None pivots the columns data_operations.season_pivot_values picks when the step runs."""
+    def needs(schema):
+        if values is None:
+            return None
+        return ['latitude', 'longitude', 'season'] + list(values)
+    return FrameStep("Reduce by season", lambda data: data_operations.reduce_by_season(data, values, aggregate), needs)
+
+
+class _Stage:
+    """
+    Working state between two whole-frame steps: the input frame, the columns replaced so far
+    and the pending row mask. Nothing is copied until compact() or result().
+    """
+
+    def __init__(self, frame, needed):
+        self.frame = frame
+        self.needed = needed
+        self.replaced = {}
+        self.mask = None
+
+    def names(self):
+        return [c for c in self.frame.columns if self.needed is None or c in self.needed]
+
+    def schema(self):
+        return {name: is_numeric_column(self.replaced.get(name, self.frame[name])) for name in self.frame.columns}
+
+    def current(self, names):
+        """The given columns with the rows kept so far."""
+        data = pd.DataFrame({name: self.replaced.get(name, self.frame[name]) for name in names},
+                            index=self.frame.index, columns=names, copy=False)
+        return data if self.mask is None else data[self.mask]
+
+    def apply_filter(self, step):
+        keep = np.asarray(step.mask(self.current(step.reads(self.schema()))), dtype=bool)
+        if self.mask is None:
+            self.mask = keep
+        else:
+            # The new mask was computed over the rows kept so far
+            combined = self.mask.copy()
+            combined[combined] = keep
+            self.mask = combined
+
+    def compact(self):
+        """Apply the pending mask, once, to the columns still needed."""
+        if self.mask is not None:
+            self.frame = self.current(self.names())
+            self.replaced = {}
+            self.mask = None
+
+    def apply_maps(self, steps, notes, max_workers):
+        """Run consecutive map steps column by column, each column through all of them in turn."""
+        def run_column(name):
+            series = self.replaced.get(name, self.frame[name])
+            column_notes = []
+            changed = False
+            for step in steps:
+                if step.selects(name, is_numeric_column(series)):
+                    series = step.transform(series, column_notes)
+                    changed = True
+            return name, series if changed else None, column_notes
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for name, series, column_notes in executor.map(run_column, self.names()):
+                if series is not None:
+                    self.replaced[name] = series
+                notes.extend(column_notes)
+
+    def result(self):
+        names = self.names()
+        if self.mask is None and not self.replaced and len(names) == len(self.frame.columns):
+            return self.frame
+        return self.current(names)
+
+
+class LazyPlan:
+    """An immutable sequence of steps; then() returns a longer plan."""
+
+    def __init__(self, steps=()):
+        self.steps = tuple(steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def then(self, step):
+        return LazyPlan(self.steps + (step,))
+
+    def titles(self):
+        return [step.title for step in self.steps]
+
+    def stages(self):
+        """Split the plan at whole-frame steps: [(filter/map steps, frame step or None), ...]."""
+        stages, current = [], []
+        for step in self.steps:
+            if isinstance(step, FrameStep):
+                stages.append((current, step))
+                current = []
+            else:
+                current.append(step)
+        if current:
+            stages.append((current, None))
+        return stages
+
+    @staticmethod
+    def needed_columns(data, steps, barrier):
+        """
+        Columns a stage has to compute: those read by its filters and by the frame step ending
+        it, following the predicted numeric/non-numeric schema through the map steps.
+        None when every column is needed.
+        """
+        if barrier is None:
+            return None
+        schema = {name: is_numeric_column(data[name]) for name in data.columns}
+        needed = set()
+        for step in steps:
+            if isinstance(step, FilterStep):
+                needed.update(step.reads(schema))
+            else:
+                for name, numeric in schema.items():
+                    if step.selects(name, numeric):
+                        schema[name] = step.output_numeric
+        barrier_needs = barrier.needs(schema)
+        if barrier_needs is None:
+            return None
+        return needed | set(barrier_needs)
+
+    def execute(self, data, progress=None, max_workers=None):
+        """
+        Run the plan on data. Returns (result, notes) where notes lists skipped columns and
+        per-column errors. progress, if given, is called with the fraction of stages done and
+        returns False to cancel (the function then returns None).
+        """
+        notes = []
+        max_workers = max_workers or min(8, os.cpu_count() or 1)
+        stages = self.stages()
+        for position, (steps, barrier) in enumerate(stages):
+            stage = _Stage(data, self.needed_columns(data, steps, barrier))
+            run = []
+            for step in steps + [None]:
+                if isinstance(step, MapStep):
+                    run.append(step)
+                    continue
+                if run:
+                    # Map statistics must only see the rows kept so far
+                    stage.compact()
+                    stage.apply_maps(run, notes, max_workers)
+                    run = []
+                if isinstance(step, FilterStep):
+                    stage.apply_filter(step)
+            data = stage.result()
+            if barrier is not None:
+                data = barrier.fn(data)
+            if progress is not None and progress((position + 1) / len(stages)) is False:
+                return None
+        return data, notes
@@ -0,0 +1,65 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Coordinates are exact join keys for merging/reduction, so they are never rounded to float32
+DEFAULT_EXCLUDED_COLUMNS = ('latitude', 'longitude')
+
+
+def memory_usage(data):
+    """Total resident size of a DataFrame in bytes, including the contents of string columns."""
+    return int(data.memory_usage(deep=True).sum())
+
+
+def available_memory():
+    """Physical memory currently free, in bytes, or None where the platform does not report it."""
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def compact_dtypes(data, excluded_columns=DEFAULT_EXCLUDED_COLUMNS, float_rtol=1e-6, category_ratio=0.5):
+    """
+    Return a copy of the DataFrame with narrower dtypes and a list of the conversions made.
+    - float64 columns become float32 when every value round-trips within float_rtol (and stays finite)
+    - integer columns are narrowed to the smallest integer type holding their range
+    - string columns whose distinct values make up at most category_ratio of the rows become categoricals
+    """
+    compacted = {}
+    changes = []
+    for column in data.columns:
+        series = data[column]
+        new_series = series
+        if column not in excluded_columns:
+            if pd.api.types.is_float_dtype(series.dtype) and series.dtype == np.float64:
+                values = series.to_numpy()
+                with np.errstate(over='ignore', invalid='ignore'):
+                    narrowed = values.astype(np.float32)
+                    fits = np.isfinite(narrowed) | ~np.isfinite(values)
+                if fits.all() and np.allclose(narrowed, values, rtol=float_rtol, atol=0, equal_nan=True):
+                    new_series = pd.Series(narrowed, index=series.index, name=column)
+            elif pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_extension_array_dtype(series.dtype):
+                new_series = pd.to_numeric(series, downcast='integer')
+            elif pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+                if len(series) and series.nunique(dropna=True) <= category_ratio * len(series):
+                    new_series = series.astype('category')
+        if new_series.dtype != series.dtype:
+            changes.append((column, str(series.dtype), str(new_series.dtype)))
+        compacted[column] = new_series
+    return pd.DataFrame(compacted, index=data.index), changes
+
+
+def memory_report(before_bytes, after_bytes, changes):
+    """Human readable before/after summary of a compact load."""
+    saved = before_bytes - after_bytes
+    ratio = (saved / before_bytes * 100) if before_bytes else 0.0
+    lines = [
+        f"Memory before: {before_bytes / 1e6:,.1f} MB",
+        f"Memory after: {after_bytes / 1e6:,.1f} MB",
+        f"Saved: {saved / 1e6:,.1f} MB ({ratio:.1f}%)",
+    ]
+    if changes:
+        lines.append("")
+        lines.extend(f"{column}: {old} -> {new}" for column, old, new in changes)
+    return "\n".join(lines)
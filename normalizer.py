@@ -0,0 +1,155 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Columns left untouched by normalization and discretization
+NON_FEATURE_COLUMNS = ['time', 'latitude', 'longitude', 'geometry']
+NORMALIZATION_METHODS = ('min_max', 'zscore')
+# Columns whose range (min-max) or standard deviation (z-score) is below this are not scaled
+MIN_SPREAD = 1e-6
+
+
+def feature_columns(data):
+    return [col for col in data.select_dtypes(include=['number']).columns if col not in NON_FEATURE_COLUMNS]
+
+
+def numeric_block(data, columns, dtype='float64'):
+    """(columns, rows) array holding one contiguous row per column, missing values as NaN."""
+    block = np.empty((len(columns), len(data)), dtype=dtype)
+    for row, column in zip(block, columns):
+        row[:] = data[column].to_numpy(dtype=dtype, na_value=np.nan)
+    return block
+
+
+class Normalizer:
+    """
+    Min-max or z-score scaling with fitted parameters.
+    fit() computes the parameters of every numeric feature column with vectorised reductions,
+    one column at a time; transform() applies them to this or any other frame (e.g. the chunks
+    of a new file) without refitting, optionally in place. Parameters can be saved to and loaded
+    from JSON.
+    """
+
+    def __init__(self, method='min_max', dtype='float64'):
+        if method not in NORMALIZATION_METHODS:
+            raise ValueError(f"Unknown normalization method: {method}")
+        self.method = method
+        self.dtype = np.dtype(dtype)
+        # Per scaled column: value = (value - offset) / scale
+        self.offsets = {}
+        self.scales = {}
+        self.skipped = []
+
+    def fit(self, data):
+        columns = feature_columns(data)
+        # Reductions run on each column's own values (a view for float64 columns), so the only
+        # temporaries are one column wide; all-NaN (or empty) columns give NaN and are skipped
+        offsets, scales = np.full(len(columns), np.nan), np.full(len(columns), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for position, column in enumerate(columns):
+                values = data[column].to_numpy(dtype='float64', na_value=np.nan)
+                if not len(values):
+                    continue
+                if self.method == 'min_max':
+                    # fmin/fmax skip NaN, so no filled copy is needed
+                    offsets[position] = np.fmin.reduce(values)
+                    scales[position] = np.fmax.reduce(values) - offsets[position]
+                else:
+                    # Mean, then sample standard deviation of the centred values
+                    missing = np.isnan(values)
+                    count = len(values) - np.count_nonzero(missing)
+                    offsets[position] = np.sum(values, where=~missing) / count
+                    centred = values - offsets[position]
+                    centred[missing] = 0.0
+                    scales[position] = np.sqrt(np.dot(centred, centred) / (count - 1))
+        self.offsets, self.scales, self.skipped = {}, {}, []
+        for column, offset, scale in zip(columns, offsets, scales):
+            if scale > MIN_SPREAD:
+                self.offsets[column] = float(offset)
+                self.scales[column] = float(scale)
+            else:
+                self.skipped.append(column)
+        return self
+
+    def columns(self, data):
+        """Fitted columns present in data."""
+        return [column for column in self.offsets if column in data.columns]
+
+    def transform(self, data, inplace=False):
+        """
+        data with the fitted columns scaled, as self.dtype. By default the values are scaled in
+        one working block and a new frame is returned; the other columns keep the input's buffers.
+        With inplace=True the columns of data itself are replaced one by one, so only one column
+        is converted at a time, and data is returned.
+        """
+        columns = self.columns(data)
+        if not columns:
+            return data
+        if inplace:
+            for column in columns:
+                values = data[column].to_numpy(dtype=self.dtype, na_value=np.nan, copy=True)
+                values -= self.dtype.type(self.offsets[column])
+                values /= self.dtype.type(self.scales[column])
+                data[column] = values
+            return data
+        block = numeric_block(data, columns, self.dtype)
+        block -= np.array([self.offsets[c] for c in columns], dtype=self.dtype)[:, None]
+        block /= np.array([self.scales[c] for c in columns], dtype=self.dtype)[:, None]
+        updated = data.copy(deep=False)
+        for column, values in zip(columns, block):
+            updated[column] = values
+        return updated
+
+    def fit_transform(self, data, inplace=False):
+        return self.fit(data).transform(data, inplace)
+
+    def to_dict(self):
+        return {'method': self.method, 'dtype': self.dtype.name, 'offsets': self.offsets, 'scales': self.scales,
+                'skipped': self.skipped}
+
+    @classmethod
+    def from_dict(cls, parameters):
+        normalizer = cls(parameters['method'], parameters.get('dtype', 'float64'))
+        normalizer.offsets = {column: float(value) for column, value in parameters['offsets'].items()}
+        normalizer.scales = {column: float(value) for column, value in parameters['scales'].items()}
+        normalizer.skipped = list(parameters.get('skipped', []))
+        return normalizer
+
+    def save(self, path):
+        with open(path, 'w') as handle:
+            json.dump(self.to_dict(), handle, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as handle:
+            return cls.from_dict(json.load(handle))
+
+    def transform_csv(self, input_path, output_path, chunk_size=500000, progress=None):
+        """
+        Stream a CSV file through transform() chunk by chunk into output_path (written under a
+        temporary name and renamed at the end). progress, if given, is called with the fraction of
+        the input read and returns False to cancel (the function then returns None).
+        Returns (output path, rows written).
+        """
+        total_bytes = os.path.getsize(input_path) or 1
+        temp_path = output_path + '.partial'
+        rows = 0
+        completed = True
+        try:
+            with open(input_path, 'rb') as source, open(temp_path, 'wb') as output:
+                for chunk in pd.read_csv(source, chunksize=chunk_size):
+                    self.transform(chunk, inplace=True).to_csv(output, index=False, header=rows == 0)
+                    rows += len(chunk)
+                    if progress is not None and progress(min(source.tell() / total_bytes, 1.0)) is False:
+                        completed = False
+                        break
+            if not completed:
+                os.remove(temp_path)
+                return None
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return output_path, rows
@@ -0,0 +1,107 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+# Percentiles computed for every numeric column in a single partition pass
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def numeric_columns(data):
+    return data.select_dtypes(include=['number']).columns.tolist()
+
+
+def column_values(series):
+    """Float view of a numeric column with missing values as NaN."""
+    return series.to_numpy(dtype=float, na_value=np.nan)
+
+
+def compute_outlier_statistics(data):
+    """
+    Q1/Q3/IQR, IQR fences, 5th/95th percentiles, mean and median of every numeric column.
+    Returns a DataFrame with one column per data column and one row per statistic.
+    """
+    stats = {}
+    for column in numeric_columns(data):
+        values = column_values(data[column])
+        with warnings.catch_warnings():
+            # All-NaN columns simply yield NaN statistics
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            p05, q1, median, q3, p95 = np.nanpercentile(values, PERCENTILES)
+            mean = np.nanmean(values)
+        iqr = q3 - q1
+        stats[column] = {
+            'p05': p05, 'q1': q1, 'median': median, 'q3': q3, 'p95': p95, 'mean': mean,
+            'iqr': iqr, 'lower': q1 - 1.5 * iqr, 'upper': q3 + 1.5 * iqr,
+        }
+    return pd.DataFrame(stats)
+
+
+class OutlierStatistics:
+    """Caches compute_outlier_statistics against the dataset version it was computed for."""
+
+    def __init__(self):
+        self.version = None
+        self.stats = None
+
+    def get(self, data, version):
+        if self.stats is None or self.version != version:
+            self.stats = compute_outlier_statistics(data)
+            self.version = version
+        return self.stats
+
+    def invalidate(self):
+        self.version = None
+        self.stats = None
+
+
+def _writable_copy(series, fill_values):
+    """Own copy of a column's values, upcast to float if the replacement values are not integral."""
+    values = series.to_numpy(copy=True)
+    if not np.issubdtype(values.dtype, np.number):
+        values = column_values(series)
+    fill_values = np.asarray(fill_values, dtype=float)
+    if np.issubdtype(values.dtype, np.integer) and not np.all(np.mod(fill_values[~np.isnan(fill_values)], 1) == 0):
+        values = values.astype(float)
+    return values
+
+
+def outlier_mask(data, stats):
+    """Boolean row mask of rows with an IQR outlier in any numeric column, built one column at a time."""
+    mask = np.zeros(len(data), dtype=bool)
+    for column in stats.columns:
+        values = column_values(data[column])
+        mask |= (values < stats.at['lower', column]) | (values > stats.at['upper', column])
+    return mask
+
+
+def remove_outliers(data, stats):
+    """Rows without any IQR outlier."""
+    return data[~outlier_mask(data, stats)]
+
+
+def replace_outliers(data, stats, statistic='mean'):
+    """Replace IQR outliers with the column 'mean' or 'median'. Only affected columns are rewritten."""
+    updated = data.copy(deep=False)
+    for column in stats.columns:
+        values = column_values(data[column])
+        mask = (values < stats.at['lower', column]) | (values > stats.at['upper', column])
+        if mask.any():
+            fill = stats.at[statistic, column]
+            new_values = _writable_copy(data[column], [fill])
+            np.putmask(new_values, mask, fill)
+            updated[column] = new_values
+    return updated
+
+
+def cap_outliers(data, stats):
+    """Clip every numeric column to its 5th and 95th percentiles."""
+    updated = data.copy(deep=False)
+    for column in stats.columns:
+        lower, upper = stats.at['p05', column], stats.at['p95', column]
+        if np.isnan(lower) or np.isnan(upper):
+            continue
+        new_values = _writable_copy(data[column], [lower, upper])
+        bounds = np.array([lower, upper]).astype(new_values.dtype)
+        np.clip(new_values, bounds[0], bounds[1], out=new_values)
+        updated[column] = new_values
+    return updated
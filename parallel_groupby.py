@@ -0,0 +1,157 @@
+"""
+Process-parallel group-by aggregation over spatial tiles.
+The rows are split into tiles of consecutive grid cells (latitude bands, since cells are
+numbered in latitude/longitude order), and every tile is sorted and reduced in a worker process.
+The group codes, the tile ordering of the rows and the value columns are placed once in shared
+memory, so workers read them in place instead of receiving pickled copies; only the per-group
+results come back. Tiles cover increasing cell ranges, so concatenating their results in tile
+order gives the same sorted output as the single-process aggregation.
+"""
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from resampling import (check_aggregates, value_columns, group_codes, reduce_groups, grouped_frame, stable_order,
+                        aggregate_groups)
+
+# Below this many rows starting worker processes costs more than it saves
+MIN_PARALLEL_ROWS = 1000000
+# Tiles per worker, so that workers finishing early pick up more tiles
+TILES_PER_WORKER = 4
+
+_executor = None
+_executor_workers = 0
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _get_executor(workers):
+    """Process pool kept between calls (spawned processes are slow to start). Spawn is used because
+    forking a process that runs Qt and worker threads is unsafe."""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        shutdown_pool()
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _executor_workers = workers
+    return _executor
+
+
+def shutdown_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _shared_array(shape, dtype):
+    """New shared memory block holding an array. Returns (block, array, (name, shape, dtype))."""
+    dtype = np.dtype(dtype)
+    block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf), (block.name, shape, dtype.str)
+
+
+def _attach(spec):
+    """(block, array) for a shared array created by _share in another process."""
+    name, shape, dtype = spec
+    try:
+        block = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching also registers the block with the resource tracker, which
+        # pool workers share with the parent: the parent's unlink unregisters it
+        block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _reduce_tile(groups_spec, order_spec, values_spec, start, stop, aggregates):
+    """Worker: reduce the rows order[start:stop] of one tile. Only the requested aggregates are sent back."""
+    blocks, arrays = [], []
+    try:
+        for spec in (groups_spec, order_spec, values_spec):
+            block, array = _attach(spec)
+            blocks.append(block)
+            arrays.append(array)
+        groups, order, values = arrays
+        first_rows, run_groups, reduced = reduce_groups(groups, order[start:stop], list(values), aggregates)
+        return first_rows, run_groups, [{aggregate: results[aggregate] for aggregate in aggregates}
+                                        for results in reduced]
+    finally:
+        # Views of the shared buffers must be released before the blocks are closed
+        arrays = groups = order = values = None
+        for block in blocks:
+            block.close()
+
+
+def tile_bounds(groups, n_periods, tiles):
+    """
+    Cell-id boundaries of `tiles` tiles holding about the same number of rows, so that tiles
+    take about the same time to reduce. Returns (tile of every row or -1, number of tiles).
+    """
+    valid = groups >= 0
+    cells = np.where(valid, groups // max(n_periods, 1), 0)
+    rows_per_cell = np.bincount(cells[valid])
+    cumulative = np.cumsum(rows_per_cell)
+    bounds = np.unique(np.searchsorted(cumulative, np.linspace(0, cumulative[-1], tiles + 1)[1:-1], side='left'))
+    tile_of_cell = np.zeros(len(rows_per_cell), dtype=np.int64)
+    tile_of_cell[bounds] = 1
+    tile_of_cell = np.cumsum(tile_of_cell)
+    return np.where(valid, tile_of_cell[cells], -1), len(bounds) + 1
+
+
+def parallel_aggregate_groups(data, codes, periods, aggregates=('mean',), columns=None, period_column='time',
+                              workers=None, min_rows=MIN_PARALLEL_ROWS):
+    """
+    Same result as resampling.aggregate_groups, computed over spatial tiles in `workers` processes
+    (default: all cores). Small inputs, or a single worker, use the single-process path.
+    """
+    workers = workers or default_workers()
+    if workers <= 1 or len(data) < min_rows:
+        return aggregate_groups(data, codes, periods, aggregates, columns, period_column)
+    check_aggregates(aggregates)
+    columns = value_columns(data, columns)
+    groups = group_codes(data, codes, len(periods))
+    if not (groups >= 0).any():
+        return aggregate_groups(data, codes, periods, aggregates, columns, period_column)
+
+    # Rows ordered by tile; rows without a group (tile -1) are left out
+    row_tiles, tiles = tile_bounds(groups, len(periods), workers * TILES_PER_WORKER)
+    grouped_rows = np.flatnonzero(row_tiles >= 0)
+    order = grouped_rows[stable_order(row_tiles[grouped_rows])]
+    tile_starts = np.concatenate(([0], np.cumsum(np.bincount(row_tiles[grouped_rows], minlength=tiles))))
+
+    blocks, specs = [], []
+    try:
+        # Groups, tile order and value columns are written straight into shared memory
+        for source in (groups, order):
+            block, array, spec = _shared_array(source.shape, source.dtype)
+            array[...] = source
+            blocks.append(block)
+            specs.append(spec)
+        block, values, spec = _shared_array((len(columns), len(data)), 'float64')
+        blocks.append(block)
+        specs.append(spec)
+        for position, column in enumerate(columns):
+            values[position] = data[column].to_numpy(dtype='float64', na_value=np.nan)
+
+        executor = _get_executor(workers)
+        futures = [executor.submit(_reduce_tile, *specs, tile_starts[tile], tile_starts[tile + 1], tuple(aggregates))
+                   for tile in range(tiles) if tile_starts[tile + 1] > tile_starts[tile]]
+        results = [future.result() for future in futures]
+    finally:
+        # Views of the blocks must be released before they are closed
+        array = values = None
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    first_rows = np.concatenate([result[0] for result in results])
+    run_groups = np.concatenate([result[1] for result in results])
+    reduced = [{aggregate: np.concatenate([result[2][position][aggregate] for result in results])
+                for aggregate in aggregates} for position in range(len(columns))]
+    return grouped_frame(data, first_rows, run_groups, periods, period_column, columns, reduced, aggregates)
@@ -0,0 +1,252 @@
+"""
+Headless batch runner for the preprocessing operations of the Data Mining Utility.
+
+Usage:
+    python pipeline_runner.py pipeline.json [--jobs N] [--inputs a.csv b.csv ...]
+
+The pipeline spec is a JSON file:
+    {
+        "inputs": ["data/*.csv"],            # glob patterns, one run per matching file
+        "output_dir": "processed",           # results are written as <output_dir>/<name><output_suffix>.<output_format>
+        "output_suffix": "_processed",
+        "output_format": "csv",              # csv | csv.gz | parquet | feather
+        "compact": false,                    # compact dtypes on import
+        "lazy": false,                       # run the steps as one optimized plan (lazy_plan.py)
+        "steps": [
+            {"op": "clean_outliers", "method": "remove"},        # remove | mean | median | cap; "approximate": true uses sketches
+            {"op": "remove_nan_rows"},
+            {"op": "normalize", "method": "min_max"},            # min_max | zscore; "dtype": "float32",
+                                                                 # "parameters": "params.json" reuses saved parameters,
+                                                                 # "save_parameters": "params.json" stores the fitted ones
+            {"op": "aggregate_monthly"},                         # aggregations accept "workers": N (0 = all cores)
+            {"op": "resample", "frequency": "dekad", "aggregates": ["mean", "max"]},   # hour | day | week | dekad | month | year
+            {"op": "aggregate_seasonally", "calendar": "Astronomical (Northern Hemisphere)"},
+            {"op": "reduce_by_season"},                          # "values": [...] (default: PSurf, Qair, ... present),
+                                                                 # "aggregate": "mean" for repeated (lat, lon, season) rows
+            {"op": "discretize", "column": "All Numerical Columns", "method": "equal_width", "bins": 5},
+            {"op": "merge", "file": "soil.csv", "precision": 5, "streaming": false},   # "method": "nearest", "max_distance_km": 30
+            {"op": "reduce_by_soil_polygons", "soil_file": "soil_polygons.csv", "streaming": false}
+        ]
+    }
+
+A streaming soil-polygon reduction must be the first step: it reads the input file in chunks
+instead of loading it. Files are processed in parallel worker processes with --jobs.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import data_operations
+import lazy_plan
+from csv_cache import read_csv_cached
+from sketches import DatasetSketch
+from normalizer import Normalizer, NORMALIZATION_METHODS
+from data_export import EXPORT_FORMATS
+from resampling import FREQUENCIES, AGGREGATES
+
+
+def step_clean_outliers(data, step):
+    stats = DatasetSketch.from_frame(data).outlier_statistics(data) if step.get('approximate') else None
+    return data_operations.clean_outliers(data, step.get('method', 'remove'), stats)
+
+
+def step_remove_nan_rows(data, step):
+    return data_operations.remove_nan_rows(data)
+
+
+def step_normalize(data, step):
+    # The frame belongs to this run, so its columns are scaled in place
+    if 'parameters' in step:
+        return Normalizer.load(step['parameters']).transform(data, inplace=True)
+    data, _, normalizer = data_operations.normalize(data, step.get('method', 'min_max'), step.get('dtype', 'float64'),
+                                                    inplace=True)
+    if 'save_parameters' in step:
+        normalizer.save(step['save_parameters'])
+    return data
+
+
+def step_aggregate_monthly(data, step):
+    return data_operations.aggregate_monthly(data, step.get('workers', 1) or None)
+
+
+def step_resample(data, step):
+    return data_operations.resample_time_series(data, step.get('frequency', 'month'), step.get('aggregates', ['mean']),
+                                                step.get('workers', 1) or None)
+
+
+def step_aggregate_seasonally(data, step):
+    return data_operations.aggregate_seasonally(data, step.get('calendar', data_operations.DEFAULT_SEASON_CALENDAR),
+                                                step.get('workers', 1) or None)
+
+
+def step_reduce_by_season(data, step):
+    return data_operations.reduce_by_season(data, step.get('values'), step.get('aggregate', 'mean'))
+
+
+def step_discretize(data, step):
+    column = step.get('column', "All Numerical Columns")
+    columns = None if column == "All Numerical Columns" else [column]
+    data, errors = data_operations.discretize(data, columns, step.get('method', 'equal_width'), step.get('bins', 5),
+                                              step.get('labels', data_operations.DISCRETIZATION_LABELS),
+                                              step.get('display_intervals', False))
+    if errors:
+        raise ValueError("; ".join(f"{col}: {message}" for col, message in errors.items()))
+    return data
+
+
+def step_merge(data, step):
+    if step.get('method') == 'nearest':
+        return data_operations.merge_nearest(data, step['file'], step.get('max_distance_km'))
+    precision = step.get('precision', data_operations.DEFAULT_COORDINATE_PRECISION)
+    if step.get('streaming'):
+        return data_operations.merge_on_coordinates_streaming(data, step['file'], precision,
+                                                              chunk_size=step.get('chunk_size', 1000000))
+    return data_operations.merge_on_coordinates(data, read_csv_cached(step['file']), precision)
+
+
+def step_reduce_by_soil_polygons(data, step):
+    return data_operations.reduce_by_soil_polygons(data, step['soil_file'])
+
+
+STEPS = {
+    'clean_outliers': step_clean_outliers,
+    'remove_nan_rows': step_remove_nan_rows,
+    'normalize': step_normalize,
+    'aggregate_monthly': step_aggregate_monthly,
+    'resample': step_resample,
+    'aggregate_seasonally': step_aggregate_seasonally,
+    'reduce_by_season': step_reduce_by_season,
+    'discretize': step_discretize,
+    'merge': step_merge,
+    'reduce_by_soil_polygons': step_reduce_by_soil_polygons,
+}
+
+
+def plan_step(step):
+    """The lazy_plan step for a pipeline step; operations without one run as whole-frame steps."""
+    op = step['op']
+    if op == 'clean_outliers' and not step.get('approximate'):
+        return lazy_plan.clean_outliers_step(step.get('method', 'remove'))
+    if op == 'remove_nan_rows':
+        return lazy_plan.remove_nan_rows_step()
+    if op == 'normalize' and 'parameters' not in step and 'save_parameters' not in step:
+        return lazy_plan.normalize_step(step.get('method', 'min_max'), step.get('dtype', 'float64'))
+    if op == 'aggregate_monthly':
+        return lazy_plan.aggregate_monthly_step(step.get('workers', 1) or None)
+    if op == 'resample':
+        return lazy_plan.resample_step(step.get('frequency', 'month'), step.get('aggregates', ['mean']),
+                                       step.get('workers', 1) or None)
+    if op == 'aggregate_seasonally':
+        return lazy_plan.aggregate_seasonally_step(step.get('calendar', data_operations.DEFAULT_SEASON_CALENDAR),
+                                                   step.get('workers', 1) or None)
+    if op == 'reduce_by_season':
+        return lazy_plan.reduce_by_season_step(step.get('values'), step.get('aggregate', 'mean'))
+    if op == 'discretize':
+        column = step.get('column', "All Numerical Columns")
+        return lazy_plan.discretize_step(None if column == "All Numerical Columns" else [column],
+                                         step.get('method', 'equal_width'), step.get('bins', 5),
+                                         step.get('labels', data_operations.DISCRETIZATION_LABELS),
+                                         step.get('display_intervals', False), strict=True)
+    return lazy_plan.FrameStep(op, lambda data: STEPS[op](data, step))
+
+
+def validate_spec(spec):
+    """Raise ValueError for unknown operations or a misplaced streaming step before any work starts."""
+    if '.' + spec.get('output_format', 'csv') not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown output format: {spec['output_format']!r}")
+    steps = spec.get('steps', [])
+    for position, step in enumerate(steps):
+        if step.get('op') not in STEPS:
+            raise ValueError(f"Step {position + 1}: unknown operation {step.get('op')!r}")
+        if step['op'] == 'reduce_by_soil_polygons':
+            if 'soil_file' not in step:
+                raise ValueError(f"Step {position + 1}: 'soil_file' is required")
+            if step.get('streaming') and position != 0:
+                raise ValueError(f"Step {position + 1}: a streaming reduction must be the first step")
+        if step['op'] == 'normalize' and step.get('method', 'min_max') not in NORMALIZATION_METHODS:
+            raise ValueError(f"Step {position + 1}: unknown normalization method {step['method']!r}")
+        if step['op'] == 'resample':
+            if step.get('frequency', 'month') not in FREQUENCIES.values():
+                raise ValueError(f"Step {position + 1}: unknown frequency {step['frequency']!r}")
+            unknown = [a for a in step.get('aggregates', ['mean']) if a not in AGGREGATES]
+            if unknown:
+                raise ValueError(f"Step {position + 1}: unknown aggregates {unknown}")
+        if step['op'] == 'reduce_by_season' and step.get('aggregate', 'mean') not in AGGREGATES:
+            raise ValueError(f"Step {position + 1}: unknown aggregate {step['aggregate']!r}")
+        if step['op'] == 'merge' and 'file' not in step:
+            raise ValueError(f"Step {position + 1}: 'file' is required")
+
+
+def output_path_for(input_path, spec):
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    output_dir = spec.get('output_dir', os.path.dirname(input_path))
+    return os.path.join(output_dir, f"{name}{spec.get('output_suffix', '_processed')}.{spec.get('output_format', 'csv')}")
+
+
+def run_pipeline(input_path, spec):
+    """Run every step of the spec on one input file and write the result. Returns (output path, rows)."""
+    steps = spec.get('steps', [])
+    if steps and steps[0]['op'] == 'reduce_by_soil_polygons' and steps[0].get('streaming'):
+        data = data_operations.reduce_by_soil_polygons_streaming(input_path, steps[0]['soil_file'],
+                                                                 chunk_size=steps[0].get('chunk_size', 500000))
+        steps = steps[1:]
+    else:
+        data = data_operations.load_dataset(input_path, compact=spec.get('compact', False))
+
+    if spec.get('lazy'):
+        data, _ = lazy_plan.LazyPlan([plan_step(step) for step in steps]).execute(data)
+    else:
+        for step in steps:
+            data = STEPS[step['op']](data, step)
+
+    output_path = output_path_for(input_path, spec)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    data_operations.save_dataset(data, output_path)
+    return output_path, len(data)
+
+
+def expand_inputs(patterns):
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches if matches else [pattern])
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a preprocessing pipeline over CSV files without the GUI.")
+    parser.add_argument('spec', help="JSON pipeline specification")
+    parser.add_argument('--inputs', nargs='+', help="input files or glob patterns (overrides the spec)")
+    parser.add_argument('--jobs', type=int, default=1, help="number of files processed in parallel")
+    args = parser.parse_args(argv)
+
+    with open(args.spec) as handle:
+        spec = json.load(handle)
+    validate_spec(spec)
+
+    patterns = args.inputs or spec.get('inputs') or ([spec['input']] if 'input' in spec else [])
+    inputs = expand_inputs(patterns)
+    if not inputs:
+        parser.error("no input files given")
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        started = time.time()
+        futures = {executor.submit(run_pipeline, path, spec): path for path in inputs}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                output_path, rows = future.result()
+                print(f"{path} -> {output_path} ({rows} rows)")
+            except Exception as e:
+                failures += 1
+                print(f"{path}: failed: {e}", file=sys.stderr)
+    print(f"Processed {len(inputs) - failures}/{len(inputs)} files in {time.time() - started:.1f}s")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
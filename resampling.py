@@ -0,0 +1,175 @@
+"""
+Time-series resampling of gridded data: every numeric column is reduced per (grid cell, period)
+with several aggregates at once.
+Grid cells are integer ids precomputed from latitude/longitude, periods are integer codes of
+the period start, and all aggregates come from one sort of the rows by (cell, period).
+"""
+import numpy as np
+import pandas as pd
+from coordinate_join import coordinate_codes, sorted_codes, MAX_PRECISION
+from column_stats import is_numeric_column
+
+# Display name -> frequency code
+FREQUENCIES = {
+    'Hourly': 'hour',
+    'Daily': 'day',
+    'Weekly': 'week',
+    'Dekad': 'dekad',
+    'Monthly': 'month',
+    'Yearly': 'year',
+}
+AGGREGATES = ('mean', 'min', 'max', 'sum', 'count')
+
+
+def period_starts(times, frequency):
+    """
+    Start of the period containing each timestamp, as datetime64[ns] (NaT stays NaT).
+    Weeks start on Monday; dekads are the 1st-10th, 11th-20th and 21st-end of each month.
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    if frequency == 'hour':
+        starts = times.astype('datetime64[h]')
+    elif frequency == 'day':
+        starts = times.astype('datetime64[D]')
+    elif frequency == 'week':
+        days = times.astype('datetime64[D]')
+        # 1970-01-01 was a Thursday: shift so that Mondays are multiples of 7
+        starts = days - (days.astype(np.int64) + 3) % 7
+    elif frequency == 'dekad':
+        days = times.astype('datetime64[D]')
+        months = times.astype('datetime64[M]')
+        day_of_month = (days - months.astype('datetime64[D]')).astype(np.int64)
+        starts = months.astype('datetime64[D]') + np.minimum(day_of_month // 10, 2) * 10
+    elif frequency == 'month':
+        starts = times.astype('datetime64[M]')
+    elif frequency == 'year':
+        starts = times.astype('datetime64[Y]')
+    else:
+        raise ValueError(f"Unknown frequency: {frequency}")
+    return starts.astype('datetime64[ns]')
+
+
+def cell_ids(latitude, longitude):
+    """
+    Integer grid-cell id per row, numbered in (latitude, longitude) order; -1 without valid
+    coordinates. Coordinates are matched at coordinate_join.MAX_PRECISION decimals.
+    """
+    return coordinate_codes(latitude, longitude, MAX_PRECISION)
+
+
+def stable_order(codes):
+    """
+    Stable argsort of non-negative integer codes. Codes below 2**32 are sorted as two 16-bit
+    digits, for which numpy uses a radix sort (several times faster than a 64-bit stable sort).
+    """
+    if not len(codes) or codes.max() >= 2 ** 32:
+        return np.argsort(codes, kind='stable')
+    order = np.argsort((codes & 0xFFFF).astype(np.uint16), kind='stable')
+    return order[np.argsort((codes >> 16).astype(np.uint16)[order], kind='stable')]
+
+
+def _reduce_sorted(values, starts, aggregates):
+    """Aggregates of every run values[starts[i]:starts[i + 1]] of a column already sorted by group."""
+    if not len(values):
+        return {aggregate: np.zeros(0, dtype=np.int64 if aggregate == 'count' else np.float64) for aggregate in aggregates}
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid, starts, dtype=np.int64)
+    results = {'count': counts}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if 'sum' in aggregates or 'mean' in aggregates:
+            results['sum'] = np.add.reduceat(np.where(valid, values, 0.0), starts)
+            results['mean'] = np.where(counts > 0, results['sum'] / counts, np.nan)
+        # fmin/fmax skip NaN; runs without any value give NaN
+        if 'min' in aggregates:
+            results['min'] = np.fmin.reduceat(values, starts)
+        if 'max' in aggregates:
+            results['max'] = np.fmax.reduceat(values, starts)
+    return results
+
+
+def period_codes(times, frequency):
+    """
+    (period code per row, -1 for missing times; DatetimeIndex of the period starts) with codes
+    numbered in time order. Periods are computed for the distinct timestamps only.
+    """
+    time_codes, unique_times = pd.factorize(pd.to_datetime(times, errors='coerce').to_numpy(dtype='datetime64[ns]'))
+    unique_starts = period_starts(unique_times, frequency)
+    period_of_time, periods = sorted_codes(unique_starts.view(np.int64), np.zeros(len(unique_starts), dtype=bool))
+    codes = np.where(time_codes >= 0, period_of_time[time_codes], -1)
+    return codes, pd.DatetimeIndex(periods.view('datetime64[ns]'))
+
+
+def group_codes(data, codes, n_periods):
+    """cell * n_periods + period code per row, so codes sort by (latitude, longitude, period); -1 if either is missing."""
+    cells = cell_ids(data['latitude'].to_numpy(dtype='float64', na_value=np.nan),
+                     data['longitude'].to_numpy(dtype='float64', na_value=np.nan))
+    return np.where((cells >= 0) & (codes >= 0), cells * n_periods + codes, -1)
+
+
+def value_columns(data, columns=None):
+    """The columns to aggregate: the given ones, or every numeric column except the coordinates."""
+    if columns is None:
+        columns = [c for c in data.columns if c not in ('latitude', 'longitude') and is_numeric_column(data[c])]
+    return columns
+
+
+def reduce_groups(groups, rows, values, aggregates):
+    """
+    Sort `rows` (positions with a group) by group with one stable sort, so each group is a
+    contiguous run with its rows in their original order, then reduce every array of `values`
+    over the runs. Returns (first row of each run, group of each run, [aggregates per array]).
+    """
+    rows = rows[stable_order(groups[rows])]
+    sorted_groups = groups[rows]
+    run_starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]) if len(rows) else rows
+    return rows[run_starts], sorted_groups[run_starts], [_reduce_sorted(array[rows], run_starts, aggregates)
+                                                         for array in values]
+
+
+def grouped_frame(data, first_rows, run_groups, periods, period_column, columns, reduced, aggregates):
+    """Result frame: coordinates, period and one column per value column and aggregate."""
+    result = {
+        'latitude': data['latitude'].to_numpy()[first_rows],
+        'longitude': data['longitude'].to_numpy()[first_rows],
+        period_column: periods.take(run_groups % max(len(periods), 1)),
+    }
+    for column, column_results in zip(columns, reduced):
+        for aggregate in aggregates:
+            # With the single aggregate 'mean' the value columns keep their names
+            result[column if list(aggregates) == ['mean'] else f"{column}_{aggregate}"] = column_results[aggregate]
+    return pd.DataFrame(result)
+
+
+def check_aggregates(aggregates):
+    for aggregate in aggregates:
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate: {aggregate}")
+
+
+def aggregate_groups(data, codes, periods, aggregates=('mean',), columns=None, period_column='time'):
+    """
+    One row per (latitude, longitude, period) with the aggregates of the value columns, sorted by
+    latitude, longitude and period. codes holds the period code of every row (-1: none) and
+    periods the index of period values they refer to.
+    """
+    check_aggregates(aggregates)
+    columns = value_columns(data, columns)
+    groups = group_codes(data, codes, len(periods))
+    values = [data[column].to_numpy(dtype='float64', na_value=np.nan) for column in columns]
+    first_rows, run_groups, reduced = reduce_groups(groups, np.flatnonzero(groups >= 0), values, aggregates)
+    return grouped_frame(data, first_rows, run_groups, periods, period_column, columns, reduced, aggregates)
+
+
+def resample(data, frequency='month', aggregates=('mean',), columns=None, time_column='time'):
+    """
+    One row per (latitude, longitude, period) with the requested aggregates of every numeric
+    column (columns=None) or of the given columns, sorted by latitude, longitude and period.
+    The period start is written to `time_column`. With the single aggregate 'mean' the value
+    columns keep their names, otherwise they are named '<column>_<aggregate>'.
+    Rows with unparseable times or missing coordinates are left out.
+    """
+    check_aggregates(aggregates)
+    if not {'time', 'latitude', 'longitude'}.issubset(data.columns):
+        raise ValueError("Data must contain 'time', 'latitude', and 'longitude' columns for aggregation.")
+    codes, periods = period_codes(data['time'], frequency)
+    return aggregate_groups(data, codes, periods, aggregates, columns, time_column)
@@ -0,0 +1,296 @@
+import numpy as np
+import pandas as pd
+from column_stats import is_numeric_column
+from outlier_stats import PERCENTILES
+
+
+def _float_values(series):
+    return series.to_numpy(dtype='float64', na_value=np.nan)
+
+
+class KllSketch:
+    """
+    KLL quantile sketch: a stack of compactors where level h holds items of weight 2**h.
+    A full level is sorted and every other item (random offset) is promoted to the level above,
+    so memory stays around 3k items whatever the number of values. Sketches of different chunks
+    merge by concatenating their levels.
+    """
+
+    def __init__(self, k=400, seed=None):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(8, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays at this level
+                kept = items[:len(items) % 2]
+                promoted = items[len(kept):][self.rng.integers(2)::2]
+                self.levels[level] = kept
+                self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+                # Capacities shrink when a level is added, so check again from the bottom
+                level = 0
+                continue
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.count += other.count
+        self._compress()
+
+    def quantiles(self, fractions):
+        """Approximate values at the given fractions (0..1) of the sorted data; NaN when empty."""
+        fractions = np.asarray(fractions, dtype='float64')
+        if self.count == 0:
+            return np.full(fractions.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level_items), 2.0 ** level) for level, level_items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, fractions * cumulative[-1], side='left')
+        return items[np.clip(positions, 0, len(items) - 1)]
+
+    def rank_error(self):
+        """Normalised rank error bound (99% confidence, the empirical constant of KLL sketches)."""
+        if len(self.levels) == 1:
+            return 0.0  # Nothing compacted yet: quantiles are exact
+        return 1.854 / self.k ** 0.9657
+
+
+def _bit_length(values):
+    """Number of significant bits of each uint64, vectorised."""
+    values = values.copy()
+    lengths = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = values >= (np.uint64(1) << np.uint64(shift))
+        lengths[big] += shift
+        values[big] >>= np.uint64(shift)
+    return lengths + (values > 0)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-value counter with 2**precision one-byte registers."""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes):
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        buckets = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        remainder = hashes & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        # Position of the first 1-bit in the remaining 64 - p bits
+        ranks = (64 - self.precision) - _bit_length(remainder) + 1
+        np.maximum.at(self.registers, buckets, ranks.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small cardinalities: linear counting is more accurate
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def relative_error(self):
+        """Standard error of the estimate."""
+        return 1.04 / np.sqrt(len(self.registers))
+
+
+class ColumnSketch:
+    """Exact count, missing values, mean/variance, min and max plus KLL and HyperLogLog sketches of one column."""
+
+    def __init__(self, numeric, k=400, precision=14):
+        self.numeric = numeric
+        self.count = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.quantiles = KllSketch(k) if numeric else None
+        self.distinct = HyperLogLog(precision)
+
+    def _to_non_numeric(self):
+        # A chunk with a stray string makes the loaded column an object column: from then on it
+        # is sketched like one (count and distinct values only)
+        self.numeric = False
+        self.quantiles = None
+
+    def update(self, series):
+        missing = series.isna().to_numpy()
+        self.missing += int(missing.sum())
+        if self.numeric and not is_numeric_column(series):
+            self._to_non_numeric()
+        if self.numeric:
+            values = _float_values(series)
+            values = values[~np.isnan(values)]
+            # Hash the float values so int and float chunks of one column agree
+            self.distinct.update(pd.util.hash_array(values))
+            self.quantiles.update(values)
+            if len(values):
+                self._add_moments(len(values), values.mean(), float(np.sum((values - values.mean()) ** 2)),
+                                  values.min(), values.max())
+        else:
+            values = series.to_numpy(dtype=object)[~missing]
+            self.distinct.update(pd.util.hash_array(values))
+            self.count += len(values)
+
+    def _add_moments(self, count, mean, m2, minimum, maximum):
+        # Chan et al. parallel combination of mean and sum of squared deviations
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = minimum if np.isnan(self.min) else min(self.min, minimum)
+        self.max = maximum if np.isnan(self.max) else max(self.max, maximum)
+
+    def merge(self, other):
+        self.missing += other.missing
+        self.distinct.merge(other.distinct)
+        if self.numeric and not other.numeric:
+            self._to_non_numeric()
+        if self.numeric and other.numeric:
+            self.quantiles.merge(other.quantiles)
+            if other.count:
+                self._add_moments(other.count, other.mean, other.m2, other.min, other.max)
+        else:
+            self.count += other.count
+
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+
+class DatasetSketch:
+    """
+    Mergeable per-column sketches of a dataset, built chunk by chunk.
+    Quantiles (IQR fences, 5th/95th percentiles, median) and unique counts are approximate with
+    the bounds given by error_note(); counts, missing values, mean, std, min and max are exact.
+    """
+
+    def __init__(self, k=400, precision=14):
+        self.k = k
+        self.precision = precision
+        self.columns = {}
+        self.rows = 0
+
+    @classmethod
+    def from_frame(cls, data, chunk_size=1000000, **kwargs):
+        sketch = cls(**kwargs)
+        for start in range(0, len(data), chunk_size):
+            sketch.update(data.iloc[start:start + chunk_size])
+        if not len(data):
+            sketch.update(data)
+        return sketch
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        for column in chunk.columns:
+            if column not in self.columns:
+                self.columns[column] = ColumnSketch(is_numeric_column(chunk[column]), self.k, self.precision)
+            self.columns[column].update(chunk[column])
+
+    def merge(self, other):
+        self.rows += other.rows
+        for column, sketch in other.columns.items():
+            if column in self.columns:
+                self.columns[column].merge(sketch)
+            else:
+                self.columns[column] = sketch
+
+    def numeric_columns(self, data):
+        return [column for column in data.columns if column in self.columns and self.columns[column].numeric]
+
+    def outlier_statistics(self, data):
+        """Same table as outlier_stats.compute_outlier_statistics, from the sketches."""
+        stats = {}
+        for column in self.numeric_columns(data):
+            sketch = self.columns[column]
+            p05, q1, median, q3, p95 = sketch.quantiles.quantiles(np.array(PERCENTILES) / 100)
+            iqr = q3 - q1
+            stats[column] = {
+                'p05': p05, 'q1': q1, 'median': median, 'q3': q3, 'p95': p95,
+                'mean': sketch.mean if sketch.count else np.nan,
+                'iqr': iqr, 'lower': q1 - 1.5 * iqr, 'upper': q3 + 1.5 * iqr,
+            }
+        return pd.DataFrame(stats)
+
+    def describe(self, data):
+        """(overview, stats) tables of the dataset description; Mode is not available from sketches."""
+        overview = pd.DataFrame({
+            "Column Name": [str(column) for column in data.columns],
+            "Data Type": [str(dtype) for dtype in data.dtypes],
+            "Missing Values": [self.columns[column].missing for column in data.columns],
+            "Unique Values": [f"~{self.columns[column].distinct.estimate()}" for column in data.columns],
+        }, index=data.columns)
+        rows = []
+        numeric = self.numeric_columns(data)
+        for column in numeric:
+            sketch = self.columns[column]
+            median = sketch.quantiles.quantiles([0.5])[0]
+            rows.append([sketch.mean if sketch.count else np.nan, f"~{median}", "n/a", sketch.std(), sketch.min, sketch.max])
+        stats = pd.DataFrame(rows, index=numeric, columns=["Mean", "Median", "Mode", "Std Dev", "Min", "Max"])
+        return overview, stats
+
+    def rank_error(self):
+        errors = [sketch.quantiles.rank_error() for sketch in self.columns.values() if sketch.numeric]
+        return max(errors, default=0.0)
+
+    def distinct_error(self):
+        return 1.04 / np.sqrt(1 << self.precision)
+
+    def error_note(self):
+        return (f"Approximate statistics: percentiles and medians are within ±{self.rank_error():.2%} of rank "
+                f"(99% confidence); unique counts have a ±{self.distinct_error():.2%} standard error.")
+
+
+class SketchCache:
+    """Holds the DatasetSketch of the viewer's dataset for the version it describes."""
+
+    def __init__(self):
+        self.version = None
+        self.sketch = None
+
+    def seed(self, sketch, version):
+        """Use a sketch built elsewhere (e.g. during a streaming import) for this version."""
+        self.sketch = sketch
+        self.version = version
+
+    def get(self, data, version):
+        if self.sketch is None or self.version != version:
+            self.seed(DatasetSketch.from_frame(data), version)
+        return self.sketch
+
+    def invalidate(self):
+        self.version = None
+        self.sketch = None
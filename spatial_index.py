@@ -0,0 +1,150 @@
+import ast
+import os
+import numpy as np
+import geopandas as gpd
+import shapely
+from scipy.spatial import cKDTree
+from shapely import wkt
+from shapely.geometry import Polygon
+from csv_cache import read_csv_cached
+
+
+class SoilPolygonIndex:
+    """
+    STRtree over prepared soil polygons.
+    Climate points are built in bulk from coordinate arrays and matched against the tree in one
+    vectorized query instead of a row-wise apply followed by a fresh spatial join.
+    """
+
+    def __init__(self, polygons):
+        self.polygons = np.asarray(polygons, dtype=object)
+        shapely.prepare(self.polygons)
+        self.tree = shapely.STRtree(self.polygons)
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def join(self, longitudes, latitudes):
+        """
+        Match points to the polygons that contain them (the 'within' predicate of gpd.sjoin).
+        Returns (point positions, polygon positions), one pair per match.
+        """
+        points = shapely.points(np.asarray(longitudes, dtype=float), np.asarray(latitudes, dtype=float))
+        point_positions, polygon_positions = self.tree.query(points, predicate='within')
+        return point_positions, polygon_positions
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def unit_vectors(latitudes, longitudes):
+    """Points on the unit sphere: chord distance between them grows monotonically with great-circle distance."""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+class NearestPointIndex:
+    """
+    KD-tree over the 3D unit-sphere positions of a set of lat/lon points, so nearest neighbours
+    are the same as with haversine distance, without the distortion of lat/lon degrees.
+    """
+
+    def __init__(self, latitudes, longitudes):
+        points = unit_vectors(latitudes, longitudes)
+        valid = np.isfinite(points).all(axis=1)
+        self.positions = np.flatnonzero(valid)
+        self.tree = cKDTree(points[valid])
+
+    def __len__(self):
+        return len(self.positions)
+
+    def query(self, latitudes, longitudes, max_distance_km=None):
+        """
+        Nearest indexed point of every query point, all queried at once.
+        Returns (positions, distances in km); position -1 and distance NaN where no point lies
+        within max_distance_km.
+        """
+        points = unit_vectors(latitudes, longitudes)
+        valid = np.flatnonzero(np.isfinite(points).all(axis=1))
+        positions = np.full(len(points), -1, dtype=np.int64)
+        distances = np.full(len(points), np.nan)
+        if not len(valid) or not len(self.positions):
+            return positions, distances
+        bound = np.inf
+        if max_distance_km is not None:
+            bound = 2 * np.sin(min(max_distance_km / EARTH_RADIUS_KM, np.pi) / 2) * (1 + 1e-12)
+        chords, nearest = self.tree.query(points[valid], k=1, distance_upper_bound=bound, workers=-1)
+        found = np.isfinite(chords)
+        positions[valid[found]] = self.positions[nearest[found]]
+        distances[valid[found]] = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chords[found] / 2, 0, 1))
+        return positions, distances
+
+
+def parse_soil_geometries(soil_data):
+    """Convert the 'geometry' column of raw soil data (WKT or stringified coordinate lists) into Polygons."""
+    if 'geometry' not in soil_data.columns:
+        raise ValueError("Soil data must have a 'geometry' column.")
+
+    soil_data = soil_data.copy()
+    if soil_data['geometry'].iloc[0].startswith("POLYGON"):
+        # If geometry is in WKT format
+        soil_data['geometry'] = wkt.loads(soil_data['geometry'].to_numpy())
+    else:
+        # If geometry is a stringified list of tuples
+        soil_data['geometry'] = soil_data['geometry'].apply(ast.literal_eval).apply(Polygon)
+
+    soil_gdf = gpd.GeoDataFrame(soil_data, geometry='geometry')
+    return soil_gdf.set_crs("EPSG:4326")  # Assuming WGS84 (adjust if needed)
+
+
+# Parsed soil layers and their indexes, keyed on (path, size, mtime) of the soil file
+_soil_index_cache = {}
+
+
+def load_soil_index(soil_data_path):
+    """
+    Return (soil GeoDataFrame, SoilPolygonIndex) for a soil CSV file.
+    The parsed layer and its tree are kept for the session, so reducing several climate files
+    against the same soil layer builds the index only once. Callers must not modify the frame.
+    """
+    stat = os.stat(soil_data_path)
+    key = (os.path.abspath(soil_data_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _soil_index_cache:
+        soil_gdf = parse_soil_geometries(read_csv_cached(soil_data_path))
+        # Drop indexes of older versions of the same file
+        for stale_key in [k for k in _soil_index_cache if k[0] == key[0]]:
+            del _soil_index_cache[stale_key]
+        _soil_index_cache[key] = (soil_gdf, SoilPolygonIndex(soil_gdf.geometry.to_numpy()))
+    return _soil_index_cache[key]
+
+
+def clear_soil_index_cache():
+    _soil_index_cache.clear()
+
+
+# Reference grids and their KD-trees, keyed on (path, size, mtime) like the soil indexes
+_point_index_cache = {}
+
+
+def load_point_index(data_path):
+    """
+    Return (DataFrame, NearestPointIndex) for a CSV file with 'latitude' and 'longitude' columns.
+    Kept for the session, so repeated nearest merges against the same grid reuse the tree.
+    Callers must not modify the frame.
+    """
+    stat = os.stat(data_path)
+    key = (os.path.abspath(data_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _point_index_cache:
+        data = read_csv_cached(data_path)
+        if 'latitude' not in data.columns or 'longitude' not in data.columns:
+            raise ValueError("Both files must have 'latitude' and 'longitude' columns for merging.")
+        for stale_key in [k for k in _point_index_cache if k[0] == key[0]]:
+            del _point_index_cache[stale_key]
+        _point_index_cache[key] = (data, NearestPointIndex(data['latitude'].to_numpy(), data['longitude'].to_numpy()))
+    return _point_index_cache[key]
+
+
+def clear_point_index_cache():
+    _point_index_cache.clear()
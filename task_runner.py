@@ -0,0 +1,154 @@
+import inspect
+import threading
+from collections import deque
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task function to abandon the task."""
+
+
+def accepts_argument(fn, name):
+    """True if fn can be called with the keyword argument `name`."""
+    try:
+        parameters = inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        return False
+    return name in parameters or any(p.kind == p.VAR_KEYWORD for p in parameters.values())
+
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(float, str)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class Task(QRunnable):
+    """
+    One queued operation.
+    Functions that take a `progress` keyword receive a callback(fraction, message='') that returns
+    False once the task has been cancelled; they can also raise TaskCancelled, or return None.
+    """
+
+    def __init__(self, title, fn, args=(), kwargs=None, on_start=None, on_success=None, on_error=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.title = title
+        self.fn = fn
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.on_start = on_start
+        self.on_success = on_success
+        self.on_error = on_error
+        self.signals = TaskSignals()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def report(self, fraction, message=""):
+        self.signals.progress.emit(float(fraction), message)
+        return not self.is_cancelled()
+
+    def run(self):
+        try:
+            if accepts_argument(self.fn, 'progress'):
+                self.kwargs['progress'] = self.report
+            result = self.fn(*self.args, **self.kwargs)
+            if self.is_cancelled() or result is None:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.succeeded.emit(result)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+
+
+class TaskRunner(QObject):
+    """
+    Runs queued tasks one at a time on a worker thread pool.
+    Tasks run in submission order, so each one sees the result of the previous one. on_start
+    hooks, results and errors are always delivered on the GUI thread.
+    """
+    task_started = pyqtSignal(str)
+    task_progress = pyqtSignal(float, str)
+    queue_changed = pyqtSignal(int)   # number of tasks waiting or running
+    idle = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.queue = deque()
+        self.current = None
+
+    def submit(self, title, fn, *args, on_start=None, on_success=None, on_error=None, **kwargs):
+        """
+        Queue fn(*args, **kwargs). on_start(task) runs on the GUI thread right before the task
+        starts and may adjust task.args; on_success(result) / on_error(message) run when it ends.
+        """
+        task = Task(title, fn, args, kwargs, on_start, on_success, on_error)
+        self.queue.append(task)
+        self.queue_changed.emit(self.pending_count())
+        if self.current is None:
+            self._start_next()
+        return task
+
+    def pending_count(self):
+        return len(self.queue) + (1 if self.current is not None else 0)
+
+    def is_busy(self):
+        return self.current is not None
+
+    def cancel_current(self):
+        if self.current is not None:
+            self.current.cancel()
+
+    def cancel_all(self):
+        self.queue.clear()
+        self.cancel_current()
+        self.queue_changed.emit(self.pending_count())
+
+    def _start_next(self):
+        while self.queue:
+            task = self.queue.popleft()
+            try:
+                if task.on_start is not None:
+                    task.on_start(task)
+            except Exception as e:
+                if task.on_error is not None:
+                    task.on_error(str(e))
+                continue
+            self.current = task
+            task.signals.progress.connect(self.task_progress)
+            task.signals.succeeded.connect(self._on_succeeded)
+            task.signals.failed.connect(self._on_failed)
+            task.signals.cancelled.connect(self._on_cancelled)
+            self.task_started.emit(task.title)
+            self.queue_changed.emit(self.pending_count())
+            self.pool.start(task)
+            return
+        self.queue_changed.emit(0)
+        self.idle.emit()
+
+    def _finish(self, callback, *args):
+        self.current = None
+        try:
+            if callback is not None:
+                callback(*args)
+        finally:
+            self._start_next()
+
+    def _on_succeeded(self, result):
+        self._finish(self.current.on_success, result)
+
+    def _on_failed(self, message):
+        self._finish(self.current.on_error, message)
+
+    def _on_cancelled(self):
+        self._finish(None)
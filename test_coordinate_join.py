@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+import data_operations
+
+
+def test_merge_with_missing_coordinates_on_both_sides():
+    primary = pd.DataFrame({'latitude': [1.0, np.nan, 2.0, np.nan], 'longitude': [1.0, 5.0, 3.0, 6.0],
+                            'a': [1, 2, 3, 4]})
+    secondary = pd.DataFrame({'latitude': [np.nan, 1.0, np.nan, 2.0], 'longitude': [1.0, 1.0, 2.0, 3.0],
+                              'b': [10, 20, 30, 40]})
+    merged = data_operations.merge_on_coordinates(primary, secondary)
+    expected = pd.merge(primary, secondary, on=['latitude', 'longitude'])
+    pd.testing.assert_frame_equal(merged, expected)
+
+
+def test_merge_keeps_longitudes_above_180():
+    primary = pd.DataFrame({'latitude': [10.0, 10.0], 'longitude': [200.0, 359.5], 'a': [1, 2]})
+    secondary = pd.DataFrame({'latitude': [10.0, 10.0], 'longitude': [359.5, 200.0], 'b': [3, 4]})
+    merged = data_operations.merge_on_coordinates(primary, secondary)
+    assert merged['b'].tolist() == [4, 3]
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+from histogram_cache import HistogramCache, BIN_CHOICES
+
+
+def test_every_bin_choice_matches_np_histogram():
+    rng = np.random.default_rng(0)
+    # Rounded values sit exactly on many bin edges; the lower bound is negative and not aligned
+    values = np.round(rng.uniform(-3.7, 12.3, 100000), 1)
+    groups = rng.choice(['a', 'b', 'c'], len(values))
+    data = pd.DataFrame({'value': values, 'group': groups})
+    cache = HistogramCache()
+    for bins in BIN_CHOICES:
+        expected, expected_edges = np.histogram(values, bins)
+        edges, counts, _ = cache.get(data, 1, 'value', None, bins)
+        np.testing.assert_array_equal(edges, expected_edges)
+        np.testing.assert_array_equal(counts[0], expected)
+        _, grouped, labels = cache.get(data, 1, 'value', 'group', bins)
+        for label, row in zip(labels, grouped):
+            np.testing.assert_array_equal(row, np.histogram(values[groups == label], expected_edges)[0])
@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+import data_operations
+
+
+def test_reduce_by_season_keeps_longitudes_above_180():
+    latitudes, longitudes = np.meshgrid(np.arange(0, 5) * 0.5, np.arange(170, 200.5, 0.5), indexing='ij')
+    cells = pd.DataFrame({'latitude': latitudes.ravel(), 'longitude': longitudes.ravel()})
+    seasons = ['Fall', 'Spring', 'Summer', 'Winter']
+    data = pd.concat([cells.assign(season=season) for season in seasons], ignore_index=True)
+    data['Tair'] = np.random.default_rng(0).normal(size=len(data))
+
+    reduced = data_operations.reduce_by_season(data, ['Tair'])
+    expected = data.pivot_table(index=['latitude', 'longitude'], columns='season', values='Tair')
+    expected.columns = [f"Tair{season}" for season in expected.columns]
+    expected = expected.reset_index()
+    assert len(reduced) == len(cells)
+    pd.testing.assert_frame_equal(reduced, expected)
@@ -0,0 +1,98 @@
+"""
+Wide reshape of gridded data: one row per grid cell and one column per (value column, label),
+e.g. 'TairSummer'. Every input row is given the slot label * cells + cell of the output, so each
+value column is scattered (or, for rows repeating a cell and label, aggregated) straight into a
+label-major block whose rows are the output columns, without a sort or a MultiIndex.
+"""
+import numpy as np
+import pandas as pd
+from resampling import AGGREGATES, cell_ids
+
+BYTES_PER_VALUE = 8
+
+
+def pivot_codes(data, column):
+    """(cell id per row, label code per row, sorted labels); missing coordinates or labels get -1."""
+    if not {'latitude', 'longitude', column}.issubset(data.columns):
+        raise ValueError(f"Data must contain 'latitude', 'longitude' and '{column}' columns for this reduction.")
+    cells = cell_ids(data['latitude'].to_numpy(dtype='float64', na_value=np.nan),
+                     data['longitude'].to_numpy(dtype='float64', na_value=np.nan))
+    label_codes, labels = pd.factorize(data[column], sort=True)
+    return cells, label_codes, labels
+
+
+def output_rows(cells, label_codes):
+    """(rows with a cell and a label, output row of each cell id or -1, number of output rows)."""
+    kept = np.flatnonzero((cells >= 0) & (label_codes >= 0))
+    present = np.zeros(cells.max() + 1 if len(cells) else 0, dtype=bool)
+    present[cells[kept]] = True
+    # Cell ids are numbered in (latitude, longitude) order, so the output stays sorted
+    row_of_cell = np.where(present, np.cumsum(present) - 1, -1)
+    return kept, row_of_cell, int(present.sum())
+
+
+def estimate_pivot(data, column, values):
+    """(rows, columns, bytes) of the wide result, from the cell and label codes only."""
+    cells, label_codes, labels = pivot_codes(data, column)
+    rows = output_rows(cells, label_codes)[2]
+    columns = 2 + len(values) * len(labels)
+    return rows, columns, rows * columns * BYTES_PER_VALUE
+
+
+def _fill_block(block, slots, values, aggregate, unique):
+    """Write the values of every slot into the flat block; slots without rows keep their fill value."""
+    flat = block.reshape(-1)
+    if aggregate == 'count':
+        flat[:] = np.bincount(slots[~np.isnan(values)], minlength=flat.size)
+    elif unique:
+        flat[slots] = values
+    elif aggregate in ('mean', 'sum'):
+        valid = ~np.isnan(values)
+        sums = np.bincount(slots[valid], weights=values[valid], minlength=flat.size)
+        # Like the sort-based reduction: slots whose values are all NaN sum to 0 and average to NaN
+        filled = np.bincount(slots, minlength=flat.size) > 0
+        if aggregate == 'sum':
+            np.copyto(flat, sums, where=filled)
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                np.copyto(flat, sums / np.bincount(slots[valid], minlength=flat.size), where=filled)
+    else:
+        # The block starts as NaN and fmin/fmax skip NaN
+        (np.fmin if aggregate == 'min' else np.fmax).at(flat, slots, values)
+
+
+def pivot_by_cell(data, column, values, aggregate='mean'):
+    """
+    One row per (latitude, longitude), sorted, with a '<value><label>' column for every value
+    column and label of `column`. Rows sharing a cell and label are combined with `aggregate`
+    (one of resampling.AGGREGATES); cells without a label get NaN (0 for counts).
+    """
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate: {aggregate}")
+    missing = [value for value in values if value not in data.columns]
+    if missing:
+        raise ValueError(f"Columns not found in the data: {', '.join(map(str, missing))}")
+    cells, label_codes, labels = pivot_codes(data, column)
+    kept, row_of_cell, row_count = output_rows(cells, label_codes)
+    rows = row_of_cell[cells[kept]]
+    slots = label_codes[kept] * row_count + rows
+    # Without repeated (cell, label) rows every value is written once, whatever the aggregate
+    unique = not len(slots) or np.bincount(slots).max() == 1
+
+    # Coordinates of the first row of each cell (reversed, so the first write wins)
+    first_rows = np.empty(row_count, dtype=np.int64)
+    first_rows[rows[::-1]] = kept[::-1]
+    result = {
+        'latitude': data['latitude'].to_numpy()[first_rows],
+        'longitude': data['longitude'].to_numpy()[first_rows],
+    }
+    for value in values:
+        if aggregate == 'count':
+            block = np.zeros((len(labels), row_count), dtype=np.int64)
+        else:
+            block = np.full((len(labels), row_count), np.nan)
+        _fill_block(block, slots, data[value].to_numpy(dtype='float64', na_value=np.nan)[kept], aggregate, unique)
+        for position, label in enumerate(labels):
+            result[f"{value}{label}"] = block[position]
+    # copy=False keeps the blocks' rows as the column buffers instead of consolidating them into a new block
+    return pd.DataFrame(result, copy=False)